@@ -1,20 +1,182 @@
 import sqlite3
 import hashlib
+import hmac
+import json
 import os
+import re
+import string
+import threading
+from itertools import chain
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from db_cache import ByteLRUCache, VersionedCache
+from db_instrumentation import instrumented
+from money import DISCOUNT_CENTS_SQL, Money
+from prefix_index import PrefixIndex
+from rate_limit import TokenBucketLimiter
+from similarity import build_similarities, term_counts, vectorize
 
 class AuthDatabase:
     """Database manager for user authentication"""
     
-    def __init__(self, db_path="users.db"):
+    # Tables whose reads are served from the versioned read cache
+    VERSIONED_TABLES = ('books', 'authors', 'categories', 'category_discounts', 'purchases',
+                        'scheduled_discounts', 'effective_prices', 'book_ratings', 'users')
+    
+    # Categories created for a new database
+    DEFAULT_CATEGORIES = ("Fiction", "Non-Fiction", "Science", "History", "Biography",
+                          "Mystery", "Romance", "Technology", "Self-Help", "Other")
+    
+    # Discount in effect for book b at :now. A per-book override wins; otherwise the
+    # larger of the always-on category discount and any open category window applies.
+    EFFECTIVE_DISCOUNT_SQL = '''
+        COALESCE(
+            (SELECT MAX(s.discount_percentage) FROM scheduled_discounts s
+             WHERE s.book_id = b.id
+               AND (s.starts_at IS NULL OR s.starts_at <= :now)
+               AND (s.ends_at IS NULL OR s.ends_at > :now)),
+            MAX(
+                COALESCE((SELECT cd.discount_percentage FROM category_discounts cd
+                          WHERE cd.category_id = b.category_id), 0),
+                COALESCE((SELECT MAX(s.discount_percentage) FROM scheduled_discounts s
+                          WHERE s.category_id = b.category_id
+                            AND (s.starts_at IS NULL OR s.starts_at <= :now)
+                            AND (s.ends_at IS NULL OR s.ends_at > :now)), 0)
+            )
+        )
+    '''
+    
+    # Exact search returning fewer hits than this also runs the typo-tolerant trigram search
+    FUZZY_FALLBACK_THRESHOLD = 5
+    # Share of the query's trigrams a title/author must contain to count as a fuzzy match
+    FUZZY_MIN_SIMILARITY = 0.4
+    # Similar books stored per book
+    SIMILAR_TOP_K = 10
+    # Book texts are stored in rows of this many characters, so reading part of a book
+    # only touches the rows it needs
+    CONTENT_CHUNK_CHARS = 1 << 14
+    
+    # Facet buckets: (label, low, high) with low inclusive and high exclusive
+    PRICE_BUCKETS = (("Under $5", 0, 500), ("$5 - $10", 500, 1000), ("$10 - $20", 1000, 2000),
+                     ("$20 - $50", 2000, 5000), ("$50 and up", 5000, None))
+    RATING_BUCKETS = (("4 stars and up", 4, None), ("3 - 4 stars", 3, 4), ("Below 3 stars", 0, 3))
+    UNRATED = "Not rated"
+    
+    # browse_books sort orders: (sort column, book id column, direction). Each column
+    # lives in a table indexed on (column) and (category_id, column).
+    BROWSE_SORTS = {
+        'cheapest': ('e.final_cents', 'e.book_id', 'ASC'),
+        'newest': ('b.created_at', 'b.id', 'DESC'),
+        'top_rated': ('r.rating_avg', 'r.book_id', 'DESC'),
+    }
+    
+    # SQLite's lower() only folds A-Z; search keys are folded the same way to match it
+    ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+    
+    CATEGORY_DISCOUNTS_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER UNIQUE NOT NULL,
+            discount_percentage REAL NOT NULL CHECK(discount_percentage >= 0 AND discount_percentage <= 100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories(id)
+        )
+    '''
+    
+    SCHEDULED_DISCOUNTS_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER,
+            book_id INTEGER,
+            discount_percentage REAL NOT NULL CHECK(discount_percentage >= 0 AND discount_percentage <= 100),
+            starts_at TIMESTAMP,
+            ends_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CHECK((category_id IS NULL) != (book_id IS NULL)),
+            FOREIGN KEY (category_id) REFERENCES categories(id),
+            FOREIGN KEY (book_id) REFERENCES books(id)
+        )
+    '''
+    
+    def __init__(self, db_path="users.db", instrumentation=None, book_cache_bytes=64 * 1024 * 1024,
+                 read_cache_bytes=16 * 1024 * 1024):
         self.db_path = db_path
+        # Optional QueryInstrumentation; None keeps every call on the fast path
+        self.instrumentation = instrumentation
+        # Book texts by content digest; editions sharing a text share one entry
+        self.book_cache = ByteLRUCache(book_cache_bytes)
+        # Catalogue, discount and book detail reads, valid while their table versions are
+        # unchanged; byte-bounded like the text cache
+        self.read_cache = VersionedCache(read_cache_bytes)
+        if instrumentation is not None:
+            instrumentation.register_cache('books', self.book_cache)
+            instrumentation.register_cache('reads', self.read_cache)
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        self._seen_data_version = None
+        self._table_versions = {}
+        # Owned book ids of logged-in users: user_id -> (purchases version, set of book ids)
+        self._entitlements = {}
+        # Login throttling: 5 attempts/minute per username, and 30/minute per source
+        # (client address) when the caller knows one
+        self.username_limiter = TokenBucketLimiter(capacity=5, refill_per_second=5 / 60)
+        self.source_limiter = TokenBucketLimiter(capacity=30, refill_per_second=30 / 60)
+        self.login_rejections = {'throttled': 0, 'invalid': 0, 'banned': 0}
+        # Next time a scheduled discount window opens or closes, per schedule version
+        self._schedule_version = None
+        self._next_price_change = None
+        # Ids of banned users: (users version, set of ids)
+        self._banned_users = (None, set())
+        self._banned_lock = threading.Lock()
+        # Type-ahead index over titles and authors, built on first use
+        self._prefix_index = None
+        self._prefix_lock = threading.Lock()
+        # Reading positions not yet written: (user_id, book_id) -> character offset
+        self._pending_progress = {}
+        self._progress_lock = threading.Lock()
         self.init_database()
     
+    def _connect(self):
+        """Open a connection to the database (instrumented when enabled)"""
+        if self.instrumentation is None:
+            return sqlite3.connect(self.db_path)
+        return self.instrumentation.connect(self.db_path)
+    
+    def _sync_table_versions(self):
+        """Return current table versions, re-reading them only after a commit elsewhere"""
+        with self._version_lock:
+            if self._version_conn is None:
+                # Long-lived connection: PRAGMA data_version on it changes whenever any
+                # other connection (ours or another process's) commits
+                self._version_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            
+            data_version = self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version != self._seen_data_version:
+                versions = dict(self._version_conn.execute(
+                    'SELECT table_name, version FROM table_versions').fetchall())
+                self._table_versions = versions
+                self._seen_data_version = data_version
+            return self._table_versions
+    
+    def _cached_read(self, key, tables, loader):
+        """Serve loader() from the read cache while the given tables are unchanged"""
+        versions = self._sync_table_versions()
+        version = tuple(versions.get(table) for table in tables)
+        value = self.read_cache.get(key, version)
+        if value is None:
+            value = loader()
+            self.read_cache.put(key, version, value)
+        return value
+    
     def init_database(self):
         """Initialize the database with users table"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
+        # Takes effect only on a new, empty database; enable_incremental_vacuum converts old ones
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,60 +208,238 @@ class AuthDatabase:
         # Create default admin if it doesn't exist
         self._create_default_admin(cursor, conn)
         
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_banned ON users(id) WHERE is_banned = 1')
+        # Case-insensitive prefix search in the admin user list
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username_lower ON users(lower(username))')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email_lower ON users(lower(email))')
+        
+        # Create categories table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL
+            )
+        ''')
+        
+        cursor.execute('SELECT COUNT(*) FROM categories')
+        if cursor.fetchone()[0] == 0:
+            cursor.executemany('INSERT INTO categories (name) VALUES (?)',
+                               [(name,) for name in self.DEFAULT_CATEGORIES])
+        
+        # Create authors table (names compared case-insensitively)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS authors (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL COLLATE NOCASE
+            )
+        ''')
+        
+        # Book texts keyed by SHA-256, stored once however many books share them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_contents (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                ref_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_content_chunks (
+                digest TEXT NOT NULL REFERENCES book_contents(digest),
+                seq INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (digest, seq)
+            )
+        ''')
+        
+        # Split texts stored whole into chunk rows
+        cursor.execute("PRAGMA table_info(book_contents)")
+        if 'content' in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('SELECT digest FROM book_contents')
+            for (digest,) in cursor.fetchall():
+                cursor.execute('SELECT content FROM book_contents WHERE digest = ?', (digest,))
+                self._store_chunks(cursor, digest, cursor.fetchone()[0])
+            cursor.execute('ALTER TABLE book_contents DROP COLUMN content')
+        
         # Create books table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS books (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 title TEXT NOT NULL,
-                author TEXT NOT NULL,
-                category TEXT NOT NULL,
-                price REAL NOT NULL DEFAULT 0.0,
+                author_id INTEGER NOT NULL,
+                category_id INTEGER NOT NULL,
+                price_cents INTEGER NOT NULL DEFAULT 0,
                 description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                content_digest TEXT NOT NULL REFERENCES book_contents(digest),
+                FOREIGN KEY (author_id) REFERENCES authors(id),
+                FOREIGN KEY (category_id) REFERENCES categories(id)
             )
         ''')
         
-        # Add price column if it doesn't exist (migration for existing databases)
+        # Money is stored as integer cents (migration for databases with REAL prices)
+        self._migrate_to_cents(cursor, 'books', {'price': 'price_cents'})
+        
         cursor.execute("PRAGMA table_info(books)")
         columns = [column[1] for column in cursor.fetchall()]
         
-        if 'price' not in columns:
-            cursor.execute('''
-                ALTER TABLE books ADD COLUMN price REAL NOT NULL DEFAULT 0.0
-            ''')
+        # Move inline content into book_contents, collapsing identical texts
+        if 'content_digest' not in columns:
+            cursor.execute('ALTER TABLE books ADD COLUMN content_digest TEXT REFERENCES book_contents(digest)')
+            cursor.execute('SELECT id FROM books')
+            for (book_id,) in cursor.fetchall():
+                content = ''
+                if 'content' in columns:
+                    cursor.execute('SELECT content FROM books WHERE id = ?', (book_id,))
+                    content = cursor.fetchone()[0] or ''
+                digest = self._store_content(cursor, content)
+                cursor.execute('UPDATE books SET content_digest = ? WHERE id = ?', (digest, book_id))
+        if 'content' in columns:
+            cursor.execute('ALTER TABLE books DROP COLUMN content')
         
-        if 'content' not in columns:
+        # Replace the free-text category with a categories foreign key
+        if 'category' in columns:
+            cursor.execute('INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM books')
+            cursor.execute('ALTER TABLE books ADD COLUMN category_id INTEGER REFERENCES categories(id)')
             cursor.execute('''
-                ALTER TABLE books ADD COLUMN content TEXT DEFAULT ''
+                UPDATE books SET category_id = (SELECT id FROM categories WHERE name = books.category)
             ''')
+            cursor.execute('ALTER TABLE books DROP COLUMN category')
+        
+        # Replace the free-text author with an authors foreign key; names are
+        # normalised in Python so spelling variants collapse into one author
+        if 'author' in columns:
+            cursor.execute('ALTER TABLE books ADD COLUMN author_id INTEGER REFERENCES authors(id)')
+            cursor.execute('SELECT DISTINCT author FROM books')
+            authors = [(self._author_id(cursor, author), author) for (author,) in cursor.fetchall()]
+            cursor.executemany('UPDATE books SET author_id = ? WHERE author = ?', authors)
+            cursor.execute('ALTER TABLE books DROP COLUMN author')
+        
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_category ON books(category_id, title)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_author ON books(author_id, title)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_created ON books(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_category_created ON books(category_id, created_at)')
         
         conn.commit()
         
         # Create category_discounts table
+        cursor.execute(self.CATEGORY_DISCOUNTS_SCHEMA.format(name='category_discounts'))
+        cursor.execute("PRAGMA table_info(category_discounts)")
+        if 'category' in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('''
+                INSERT OR IGNORE INTO categories (name) SELECT category FROM category_discounts
+            ''')
+            self._rebuild_table(cursor, 'category_discounts', self.CATEGORY_DISCOUNTS_SCHEMA,
+                                'id, category_id, discount_percentage, created_at, updated_at', '''
+                SELECT d.id, c.id, d.discount_percentage, d.created_at, d.updated_at
+                FROM category_discounts d JOIN categories c ON c.name = d.category
+            ''')
+        
+        # Create scheduled_discounts table (time windows, per-category or per-book)
+        cursor.execute(self.SCHEDULED_DISCOUNTS_SCHEMA.format(name='scheduled_discounts'))
+        cursor.execute("PRAGMA table_info(scheduled_discounts)")
+        if 'category' in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('''
+                INSERT OR IGNORE INTO categories (name)
+                SELECT category FROM scheduled_discounts WHERE category IS NOT NULL
+            ''')
+            cursor.execute('DROP INDEX IF EXISTS idx_scheduled_discounts_category')
+            self._rebuild_table(cursor, 'scheduled_discounts', self.SCHEDULED_DISCOUNTS_SCHEMA,
+                                'id, category_id, book_id, discount_percentage, starts_at, ends_at, created_at', '''
+                SELECT s.id, c.id, s.book_id, s.discount_percentage, s.starts_at, s.ends_at, s.created_at
+                FROM scheduled_discounts s LEFT JOIN categories c ON c.name = s.category
+            ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scheduled_discounts_book ON scheduled_discounts(book_id)')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_scheduled_discounts_category ON scheduled_discounts(category_id)
+        ''')
+        
+        # Create effective_prices table (final prices precomputed for listings)
+        cursor.execute("PRAGMA table_info(effective_prices)")
+        if 'base_price' in [column[1] for column in cursor.fetchall()]:
+            # Derived data from the REAL-price schema; rebuilt below
+            cursor.execute('DROP TABLE effective_prices')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS effective_prices (
+                book_id INTEGER PRIMARY KEY,
+                base_cents INTEGER NOT NULL,
+                discount_percentage REAL NOT NULL DEFAULT 0,
+                final_cents INTEGER NOT NULL,
+                category_id INTEGER,
+                FOREIGN KEY (book_id) REFERENCES books(id)
+            )
+        ''')
+        # category_id is copied from books so price listings of one category are an index range
+        cursor.execute("PRAGMA table_info(effective_prices)")
+        if 'category_id' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE effective_prices ADD COLUMN category_id INTEGER')  # filled below
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_effective_prices_final ON effective_prices(final_cents)')
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS category_discounts (
+            CREATE INDEX IF NOT EXISTS idx_effective_prices_category
+            ON effective_prices(category_id, final_cents)
+        ''')
+        
+        # Create price_history table (old prices recorded by bulk repricing)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS price_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category TEXT UNIQUE NOT NULL,
-                discount_percentage REAL NOT NULL CHECK(discount_percentage >= 0 AND discount_percentage <= 100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                batch_id INTEGER NOT NULL,
+                book_id INTEGER NOT NULL,
+                old_price_cents INTEGER NOT NULL,
+                new_price_cents INTEGER NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (book_id) REFERENCES books(id)
+            )
+        ''')
+        self._migrate_to_cents(cursor, 'price_history', {'old_price': 'old_price_cents',
+                                                         'new_price': 'new_price_cents'})
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_batch ON price_history(batch_id, book_id)')
+        
+        # Trigram index over titles and authors for typo-tolerant search. FTS5's trigram
+        # tokenizer only matches exact substrings, so we keep our own postings.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_trigrams (
+                trigram TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                PRIMARY KEY (trigram, book_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_trigram_counts (
+                book_id INTEGER PRIMARY KEY,
+                trigram_count INTEGER NOT NULL
             )
         ''')
         
+        # Index books added before the trigram tables existed
+        cursor.execute('''
+            SELECT b.id, b.title, a.name
+            FROM books b
+            JOIN authors a ON a.id = b.author_id
+            WHERE b.id NOT IN (SELECT book_id FROM book_trigram_counts)
+        ''')
+        self._index_trigrams(cursor, cursor.fetchall())
+        
         # Create purchases table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS purchases (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
                 book_id INTEGER NOT NULL,
-                purchase_price REAL NOT NULL,
-                discount_applied REAL DEFAULT 0,
-                final_price REAL NOT NULL,
+                purchase_price_cents INTEGER NOT NULL,
+                discount_applied_cents INTEGER NOT NULL DEFAULT 0,
+                final_price_cents INTEGER NOT NULL,
                 purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id),
                 FOREIGN KEY (book_id) REFERENCES books(id)
             )
         ''')
+        self._migrate_to_cents(cursor, 'purchases', {'purchase_price': 'purchase_price_cents',
+                                                     'discount_applied': 'discount_applied_cents',
+                                                     'final_price': 'final_price_cents'})
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_purchases_user_book ON purchases(user_id, book_id)
+        ''')
         
         # Create reviews table
         cursor.execute('''
@@ -115,6 +455,101 @@ class AuthDatabase:
             )
         ''')
 
+        # Per-book rating totals, kept in step with reviews by add_review. Every book has
+        # a row (unrated ones average 0) so top-rated listings are a single index scan.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_ratings'")
+        ratings_existed = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_ratings (
+                book_id INTEGER PRIMARY KEY,
+                rating_count INTEGER NOT NULL DEFAULT 0,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                rating_avg REAL NOT NULL DEFAULT 0,
+                category_id INTEGER,
+                FOREIGN KEY (book_id) REFERENCES books(id)
+            )
+        ''')
+        if not ratings_existed:
+            cursor.execute('''
+                INSERT INTO book_ratings (book_id, rating_count, rating_sum, rating_avg)
+                SELECT book_id, COUNT(rating), SUM(rating), CAST(SUM(rating) AS REAL) / COUNT(rating)
+                FROM reviews
+                WHERE rating IS NOT NULL
+                GROUP BY book_id
+            ''')
+        cursor.execute("PRAGMA table_info(book_ratings)")
+        if 'rating_avg' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE book_ratings ADD COLUMN rating_avg REAL NOT NULL DEFAULT 0')
+            cursor.execute('ALTER TABLE book_ratings ADD COLUMN category_id INTEGER')
+            cursor.execute('''
+                UPDATE book_ratings SET rating_avg = CAST(rating_sum AS REAL) / rating_count
+                WHERE rating_count > 0
+            ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO book_ratings (book_id, category_id)
+            SELECT id, category_id FROM books
+        ''')
+        cursor.execute('''
+            UPDATE book_ratings SET category_id = (SELECT category_id FROM books WHERE id = book_ratings.book_id)
+            WHERE category_id IS NULL
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_book_ratings_avg ON book_ratings(rating_avg)')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_book_ratings_category ON book_ratings(category_id, rating_avg)
+        ''')
+
+        # How many users bought both books, stored in both directions and kept
+        # in step by purchase_book; rebuild_co_purchases recomputes it from purchases
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'co_purchases'")
+        co_purchases_existed = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS co_purchases (
+                book_id INTEGER NOT NULL,
+                other_book_id INTEGER NOT NULL,
+                purchase_count INTEGER NOT NULL,
+                PRIMARY KEY (book_id, other_book_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_co_purchases_top ON co_purchases(book_id, purchase_count)
+        ''')
+        if not co_purchases_existed:
+            self._rebuild_co_purchases(cursor)
+
+        # TF-IDF vectors (most frequent words of each book) and the most similar books,
+        # built by rebuild_similar_books and extended by add_book
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_terms (
+                book_id INTEGER NOT NULL,
+                term TEXT NOT NULL,
+                term_count INTEGER NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (book_id, term)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_book_terms_term ON book_terms(term, weight)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS similar_books (
+                book_id INTEGER NOT NULL,
+                similar_book_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (book_id, similar_book_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_similar_books_top ON similar_books(book_id, score)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_similar_books_other ON similar_books(similar_book_id)')
+
+        # Where each user stopped reading each book, as a character offset into the content
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reading_progress (
+                user_id INTEGER NOT NULL,
+                book_id INTEGER NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, book_id)
+            ) WITHOUT ROWID
+        ''')
+
         # Create notifications table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS notifications (
@@ -128,10 +563,66 @@ class AuthDatabase:
                 FOREIGN KEY (target_user_id) REFERENCES users(id)
             )
         ''')
+        # One index per branch of get_notifications_for_user
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notifications_broadcast
+            ON notifications(created_at) WHERE is_broadcast = 1
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notifications_target ON notifications(target_user_id, created_at)
+        ''')
+
+        # Per-table data versions, bumped by triggers in the same transaction as each write
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        for table in self.VERSIONED_TABLES:
+            cursor.execute('INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)', (table,))
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1
+                        WHERE table_name = '{table}';
+                    END
+                ''')
+        
+        # Discount windows may have opened or closed while the app was not running
+        self._refresh_effective_prices(cursor)
 
         conn.commit()
         conn.close()
     
+    @staticmethod
+    def _rebuild_table(cursor, table, schema, columns, select_sql):
+        """Recreate table from schema, copying rows with select_sql.
+        
+        Used where SQLite cannot alter a column in place (UNIQUE or CHECK constraints).
+        """
+        cursor.execute(schema.format(name=f'{table}_new'))
+        cursor.execute(f'INSERT INTO {table}_new ({columns}) {select_sql}')
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    
+    @staticmethod
+    def _migrate_to_cents(cursor, table, renames):
+        """Replace REAL money columns with integer cents columns, converting existing rows"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        for old, new in renames.items():
+            if new not in columns:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {new} INTEGER NOT NULL DEFAULT 0')
+            if old in columns:
+                cursor.execute(f'UPDATE {table} SET {new} = CAST(ROUND(COALESCE({old}, 0) * 100) AS INTEGER)')
+                # Requires SQLite 3.35+
+                cursor.execute(f'ALTER TABLE {table} DROP COLUMN {old}')
+    
     def _create_default_admin(self, cursor, conn):
         """Create default admin user if not exists"""
         cursor.execute('SELECT * FROM users WHERE role = ?', ('admin',))
@@ -158,10 +649,11 @@ class AuthDatabase:
         """Hash password using SHA-256"""
         return hashlib.sha256(password.encode()).hexdigest()
     
+    @instrumented
     def register_user(self, username, email, password):
         """Register a new user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Check if username or email already exists
@@ -183,32 +675,50 @@ class AuthDatabase:
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    def login_user(self, username, password):
-        """Verify user login credentials"""
+    @instrumented
+    def login_user(self, username, password, source=None):
+        """Verify user login credentials and ban status in a single query.
+        
+        source identifies the client (e.g. its address) for per-source throttling; the
+        desktop app has none to give, so only the per-username limit applies to it.
+        """
+        # Throttle before touching the database so bursts never reach SQLite
+        if ((source is not None and not self.source_limiter.allow(source))
+                or not self.username_limiter.allow(username)):
+            self.login_rejections['throttled'] += 1
+            return False, "Too many login attempts. Please wait a minute and try again."
+        
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
-            password_hash = self.hash_password(password)
+            # username is UNIQUE, so this is a single index lookup
             cursor.execute('''
-                SELECT id, username, email, role FROM users 
-                WHERE username = ? AND password_hash = ?
-            ''', (username, password_hash))
+                SELECT id, username, email, role, password_hash, is_banned FROM users 
+                WHERE username = ?
+            ''', (username,))
             
             user = cursor.fetchone()
             conn.close()
             
-            if user:
-                return True, user  # Returns (success, (id, username, email, role))
-            else:
+            if not user or not hmac.compare_digest(user[4], self.hash_password(password)):
+                self.login_rejections['invalid'] += 1
                 return False, "Invalid username or password"
+            
+            if user[5] == 1:
+                self.login_rejections['banned'] += 1
+                return False, "Your account has been banned. Please contact administrator."
+            
+            self.username_limiter.reset(username)
+            return True, user[:4]  # Returns (success, (id, username, email, role))
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @instrumented
     def user_exists(self, username):
         """Check if username exists"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
@@ -219,247 +729,805 @@ class AuthDatabase:
     
     # Book management methods
     
-    def add_book(self, title, author, category, price, description="", content=""):
-        """Add a new book to the database"""
+    @instrumented
+    def add_book(self, title, author, category, price_cents, description="", content=""):
+        """Add a new book to the database (price in integer cents)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
+            author_id = self._author_id(cursor, author)
             cursor.execute('''
-                INSERT INTO books (title, author, category, price, description, content)
+                INSERT INTO books (title, author_id, category_id, price_cents, description, content_digest)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (title, author, category, price, description, content))
+            ''', (title, author_id, self._category_id(cursor, category),
+                  price_cents, description, self._store_content(cursor, content)))
+            book_id = cursor.lastrowid
+            self._refresh_effective_prices(cursor, 'b.id = :book_id', {'book_id': book_id})
+            cursor.execute('''
+                INSERT INTO book_ratings (book_id, category_id) SELECT id, category_id FROM books WHERE id = ?
+            ''', (book_id,))
+            
+            cursor.execute('SELECT name FROM authors WHERE id = ?', (author_id,))
+            author_name = cursor.fetchone()[0]
+            self._index_trigrams(cursor, [(book_id, title, author_name)])
+            self._index_similar_book(cursor, book_id, term_counts([title, " ", description, " ", content]))
+            books_version = self._table_version(cursor, 'books')
             
             conn.commit()
             conn.close()
+            self._update_prefix_index(books_version, lambda index: index.add(book_id, title, author_name))
             return True, "Book added successfully"
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @instrumented
     def get_all_books(self):
         """Get all books from database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, title, author, category, price, description, created_at
-                FROM books
-                ORDER BY category, title
-            ''')
+            def load():
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT b.id, b.title, a.name, c.name, b.price_cents, b.description, b.created_at,
+                           COALESCE(e.discount_percentage, 0), COALESCE(e.final_cents, b.price_cents)
+                    FROM books b
+                    JOIN authors a ON a.id = b.author_id
+                    JOIN categories c ON c.id = b.category_id
+                    LEFT JOIN effective_prices e ON e.book_id = b.id
+                    ORDER BY c.name, b.title
+                ''')
+                
+                books = cursor.fetchall()
+                conn.close()
+                return books
             
-            books = cursor.fetchall()
-            conn.close()
-            return True, books
+            self._ensure_effective_prices()
+            return True, self._cached_read(('all_books',), ('books', 'authors', 'categories', 'effective_prices'), load)
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @instrumented
     def get_books_by_category(self):
         """Get books organized by category"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            def load():
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                # Single pass instead of one query per category
+                cursor.execute('''
+                    SELECT c.name, b.id, b.title, a.name, b.price_cents, b.description,
+                           COALESCE(e.discount_percentage, 0), COALESCE(e.final_cents, b.price_cents)
+                    FROM books b
+                    JOIN authors a ON a.id = b.author_id
+                    JOIN categories c ON c.id = b.category_id
+                    LEFT JOIN effective_prices e ON e.book_id = b.id
+                    ORDER BY c.name, b.title
+                ''')
+                
+                books_by_category = {}
+                for category, *book in cursor.fetchall():
+                    books_by_category.setdefault(category, []).append(tuple(book))
+                
+                conn.close()
+                return books_by_category
             
-            cursor.execute('''
-                SELECT DISTINCT category FROM books
-                ORDER BY category
-            ''')
+            self._ensure_effective_prices()
+            return True, self._cached_read(('books_by_category',), ('books', 'authors', 'categories', 'effective_prices'), load)
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def browse_books(self, sort='cheapest', category=None, min_cents=None, max_cents=None,
+                     after=None, limit=50):
+        """List books in a sort order, optionally within a category and final-price range.
+        
+        Paging is keyset based: pass the returned cursor as after for the next page.
+        Returns (search_books rows, cursor or None after the last page).
+        """
+        if sort not in self.BROWSE_SORTS:
+            return False, f"Unknown sort: {sort}"
+        column, id_column, direction = self.BROWSE_SORTS[sort]
+        
+        try:
+            conditions = []
+            params = {'limit': limit}
+            if category is not None:
+                # Filter on the sorted table's own category_id so the scan stays on its index
+                conditions.append(f"{id_column.split('.')[0]}.category_id = "
+                                  "(SELECT id FROM categories WHERE name = :category)")
+                params['category'] = category
+            if min_cents is not None:
+                conditions.append('e.final_cents >= :min_cents')
+                params['min_cents'] = min_cents
+            if max_cents is not None:
+                conditions.append('e.final_cents <= :max_cents')
+                params['max_cents'] = max_cents
+            if after is not None:
+                comparison = '>' if direction == 'ASC' else '<'
+                conditions.append(f'({column}, {id_column}) {comparison} (:after_value, :after_id)')
+                params['after_value'], params['after_id'] = after
             
-            categories = [row[0] for row in cursor.fetchall()]
-            books_by_category = {}
+            conn = self._connect()
+            cursor = conn.cursor()
             
-            for category in categories:
-                cursor.execute('''
-                    SELECT id, title, author, price, description
-                    FROM books
-                    WHERE category = ?
-                    ORDER BY title
-                ''', (category,))
-                books_by_category[category] = cursor.fetchall()
+            self._ensure_effective_prices()
+            cursor.execute(f'''
+                SELECT b.id, b.title, a.name, c.name, b.price_cents, b.description,
+                       e.discount_percentage, e.final_cents, {column}
+                FROM books b
+                JOIN effective_prices e ON e.book_id = b.id
+                JOIN book_ratings r ON r.book_id = b.id
+                JOIN authors a ON a.id = b.author_id
+                JOIN categories c ON c.id = b.category_id
+                WHERE {' AND '.join(conditions) or '1'}
+                ORDER BY {column} {direction}, {id_column} {direction}
+                LIMIT :limit
+            ''', params)
             
+            rows = cursor.fetchall()
             conn.close()
-            return True, books_by_category
+            
+            next_after = (rows[-1][8], rows[-1][0]) if len(rows) == limit else None
+            return True, ([row[:8] for row in rows], next_after)
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @instrumented
     def delete_book(self, book_id):
         """Delete a book from database"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute('DELETE FROM books WHERE id = ?', (book_id,))
+            cursor.execute('DELETE FROM books WHERE id = ? RETURNING content_digest', (book_id,))
+            deleted = cursor.fetchall()
+            released = [digest for (digest,) in deleted if self._release_content(cursor, digest)]
+            cursor.execute('DELETE FROM effective_prices WHERE book_id = ?', (book_id,))
+            cursor.execute('DELETE FROM scheduled_discounts WHERE book_id = ?', (book_id,))
+            cursor.execute('DELETE FROM book_trigrams WHERE book_id = ?', (book_id,))
+            cursor.execute('DELETE FROM book_trigram_counts WHERE book_id = ?', (book_id,))
+            cursor.execute('DELETE FROM book_ratings WHERE book_id = ?', (book_id,))
+            # Pairs are stored both ways; find the reverse rows through the forward ones
+            cursor.execute('''
+                DELETE FROM co_purchases
+                WHERE other_book_id = :book_id
+                  AND book_id IN (SELECT other_book_id FROM co_purchases WHERE book_id = :book_id)
+            ''', {'book_id': book_id})
+            cursor.execute('DELETE FROM co_purchases WHERE book_id = ?', (book_id,))
+            cursor.execute('DELETE FROM book_terms WHERE book_id = ?', (book_id,))
+            cursor.execute('DELETE FROM similar_books WHERE book_id = ? OR similar_book_id = ?', (book_id, book_id))
+            books_version = self._table_version(cursor, 'books')
             
             conn.commit()
             conn.close()
+            for digest in released:
+                self.book_cache.invalidate(('content', digest))
+            if deleted:
+                self._update_prefix_index(books_version, lambda index: index.remove(book_id))
             return True, "Book deleted successfully"
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    # Discount management methods
+    # Type-ahead search methods
     
-    def set_category_discount(self, category, discount_percentage):
-        """Set or update discount for a category"""
+    @instrumented
+    def suggest_books(self, prefix, limit=10):
+        """Get up to limit (id, title, author) whose title or author has a word starting with prefix"""
         try:
-            if discount_percentage < 0 or discount_percentage > 100:
-                return False, "Discount must be between 0 and 100"
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Check if discount already exists
-            cursor.execute('SELECT id FROM category_discounts WHERE category = ?', (category,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Update existing discount
-                cursor.execute('''
-                    UPDATE category_discounts 
-                    SET discount_percentage = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE category = ?
-                ''', (discount_percentage, category))
-                message = "Discount updated successfully"
-            else:
-                # Insert new discount
+            return True, self._get_prefix_index().suggest(prefix, limit)
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    def _get_prefix_index(self):
+        """Return the prefix index, rebuilding it if books changed behind its back"""
+        version = self._sync_table_versions().get('books')
+        with self._prefix_lock:
+            if self._prefix_index is None or self._prefix_index.version != version:
+                conn = self._connect()
+                cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT INTO category_discounts (category, discount_percentage)
-                    VALUES (?, ?)
-                ''', (category, discount_percentage))
-                message = "Discount added successfully"
+                    SELECT b.id, b.title, a.name
+                    FROM books b
+                    JOIN authors a ON a.id = b.author_id
+                ''')
+                self._prefix_index = PrefixIndex.build(cursor.fetchall(), version)
+                conn.close()
+            return self._prefix_index
+    
+    def _update_prefix_index(self, version, update):
+        """Apply our own committed books write to the index if it had seen every earlier one.
+        
+        Otherwise the index is left stale and rebuilt on the next suggestion.
+        """
+        with self._prefix_lock:
+            index = self._prefix_index
+            if index is not None and index.version == version - 1:
+                update(index)
+                index.version = version
+    
+    @staticmethod
+    def _table_version(cursor, table):
+        """Read a table's version inside the current transaction"""
+        cursor.execute('SELECT version FROM table_versions WHERE table_name = ?', (table,))
+        return cursor.fetchone()[0]
+    
+    # Category methods
+    
+    @instrumented
+    def get_categories(self):
+        """Get all categories as (id, name) pairs"""
+        try:
+            def load():
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                cursor.execute('SELECT id, name FROM categories ORDER BY name')
+                
+                categories = cursor.fetchall()
+                conn.close()
+                return categories
             
-            conn.commit()
-            conn.close()
-            return True, message
+            return True, self._cached_read(('categories',), ('categories',), load)
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    def get_category_discounts(self):
-        """Get all category discounts"""
+    @staticmethod
+    def _category_id(cursor, name):
+        """Return the id of a category by name, creating it if needed"""
+        cursor.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (name,))
+        cursor.execute('SELECT id FROM categories WHERE name = ?', (name,))
+        return cursor.fetchone()[0]
+    
+    # Author methods
+    
+    @instrumented
+    def get_authors(self):
+        """Get authors that have books as (id, name, book count)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, category, discount_percentage, updated_at
-                FROM category_discounts
-                ORDER BY category
-            ''')
+            def load():
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                # Counted from the books(author_id, title) index without touching book rows
+                cursor.execute('''
+                    SELECT a.id, a.name, COUNT(*)
+                    FROM authors a
+                    JOIN books b ON b.author_id = a.id
+                    GROUP BY a.id
+                    ORDER BY a.name
+                ''')
+                
+                authors = cursor.fetchall()
+                conn.close()
+                return authors
             
-            discounts = cursor.fetchall()
-            conn.close()
-            return True, discounts
+            return True, self._cached_read(('authors',), ('books', 'authors'), load)
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    def get_category_discount(self, category):
-        """Get discount for a specific category"""
+    @instrumented
+    def get_books_by_author(self, author_id):
+        """Get an author's books as (id, title, author, price, description, discount, final price)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT discount_percentage FROM category_discounts
-                WHERE category = ?
-            ''', (category,))
-            
-            result = cursor.fetchone()
-            conn.close()
+            def load():
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT b.id, b.title, a.name, b.price_cents, b.description,
+                           COALESCE(e.discount_percentage, 0), COALESCE(e.final_cents, b.price_cents)
+                    FROM books b
+                    JOIN authors a ON a.id = b.author_id
+                    LEFT JOIN effective_prices e ON e.book_id = b.id
+                    WHERE b.author_id = ?
+                    ORDER BY b.title
+                ''', (author_id,))
+                
+                books = cursor.fetchall()
+                conn.close()
+                return books
             
-            if result:
-                return True, result[0]
-            else:
-                return True, 0  # No discount
+            return True, self._cached_read(('books_by_author', author_id),
+                                           ('books', 'authors', 'effective_prices'), load)
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    def delete_category_discount(self, category):
-        """Delete discount for a category"""
+    @instrumented
+    def get_more_by_author(self, book_id, limit=5):
+        """Get other books by the author of book_id as (id, title)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute('DELETE FROM category_discounts WHERE category = ?', (category,))
+            cursor.execute('''
+                SELECT other.id, other.title
+                FROM books b
+                JOIN books other ON other.author_id = b.author_id AND other.id != b.id
+                WHERE b.id = ?
+                ORDER BY other.title
+                LIMIT ?
+            ''', (book_id, limit))
             
-            conn.commit()
+            books = cursor.fetchall()
             conn.close()
-            return True, "Discount removed successfully"
+            return True, books
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    # User management methods
+    @staticmethod
+    def _author_id(cursor, name):
+        """Return the id of an author by normalised name, creating it if needed"""
+        name = " ".join(name.split())
+        cursor.execute('INSERT OR IGNORE INTO authors (name) VALUES (?)', (name,))
+        cursor.execute('SELECT id FROM authors WHERE name = ?', (name,))
+        return cursor.fetchone()[0]
     
-    def get_all_users(self):
-        """Get all non-admin users"""
+    # Bulk repricing methods
+    
+    def _reprice_sql(self, mode, value, category=None, author=None, book_ids=None):
+        """Build the new-price expression and the WHERE clause selecting books to reprice"""
+        if mode == 'percent':
+            # Scale by (100 + value)% in basis points, rounding half up to a whole cent
+            new_price = 'MAX(0, (price_cents * (10000 + CAST(ROUND(:value * 100) AS INTEGER)) + 5000) / 10000)'
+        elif mode == 'absolute':
+            new_price = 'MAX(0, price_cents + :value)'
+        else:
+            raise ValueError("mode must be 'percent' or 'absolute'")
+        
+        conditions = [f'{new_price} != price_cents']
+        params = {'value': value}
+        if category is not None:
+            conditions.append('category_id = (SELECT id FROM categories WHERE name = :category)')
+            params['category'] = category
+        if author is not None:
+            conditions.append('author_id = (SELECT id FROM authors WHERE name = :author)')
+            params['author'] = author
+        if book_ids is not None:
+            # json_each avoids SQLite's bound-parameter limit for long id lists
+            conditions.append('id IN (SELECT value FROM json_each(:book_ids))')
+            params['book_ids'] = json.dumps(list(book_ids))
+        return new_price, ' AND '.join(conditions), params
+    
+    @instrumented
+    def preview_reprice(self, mode, value, category=None, author=None, book_ids=None):
+        """Preview a bulk price change as (book_id, title, old_cents, new_cents) rows.
+        
+        value is a percentage for mode 'percent' and integer cents for mode 'absolute'.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            new_price, where, params = self._reprice_sql(mode, value, category, author, book_ids)
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT id, username, email, is_banned, created_at
-                FROM users
-                WHERE role = 'user'
-                ORDER BY username
-            ''')
+            cursor.execute(f'''
+                SELECT id, title, price_cents, {new_price}
+                FROM books
+                WHERE {where}
+                ORDER BY category_id, title
+            ''', params)
             
-            users = cursor.fetchall()
+            changes = cursor.fetchall()
             conn.close()
-            return True, users
+            return True, changes
         
+        except ValueError as e:
+            return False, str(e)
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    def ban_user(self, user_id):
-        """Ban a user account"""
+    @instrumented
+    def apply_reprice(self, mode, value, category=None, author=None, book_ids=None):
+        """Apply a bulk price change in one transaction, recording old prices in price_history"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            new_price, where, params = self._reprice_sql(mode, value, category, author, book_ids)
+            conn = self._connect()
             cursor = conn.cursor()
             
-            cursor.execute('UPDATE users SET is_banned = 1 WHERE id = ? AND role = ?', 
-                          (user_id, 'user'))
+            # Set-based statements: SQLite reprices every matching row in one pass
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT COALESCE(MAX(batch_id), 0) + 1 FROM price_history')
+            params['batch_id'] = cursor.fetchone()[0]
             
-            if cursor.rowcount == 0:
-                conn.close()
-                return False, "User not found or cannot ban this user"
+            cursor.execute(f'''
+                INSERT INTO price_history (batch_id, book_id, old_price_cents, new_price_cents)
+                SELECT :batch_id, id, price_cents, {new_price}
+                FROM books
+                WHERE {where}
+            ''', params)
+            changed = cursor.rowcount
+            
+            cursor.execute('''
+                UPDATE books
+                SET price_cents = (SELECT new_price_cents FROM price_history h
+                             WHERE h.batch_id = :batch_id AND h.book_id = books.id)
+                WHERE id IN (SELECT book_id FROM price_history WHERE batch_id = :batch_id)
+            ''', {'batch_id': params['batch_id']})
+            self._refresh_effective_prices(
+                cursor, 'b.id IN (SELECT book_id FROM price_history WHERE batch_id = :batch_id)',
+                {'batch_id': params['batch_id']})
             
             conn.commit()
             conn.close()
-            return True, "User banned successfully"
+            return True, f"Repriced {changed} book(s)"
         
+        except ValueError as e:
+            return False, str(e)
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    def unban_user(self, user_id):
-        """Unban a user account"""
+    # Discount management methods
+    
+    @instrumented
+    def set_category_discount(self, category, discount_percentage):
+        """Set or update discount for a category"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            if discount_percentage < 0 or discount_percentage > 100:
+                return False, "Discount must be between 0 and 100"
+            
+            conn = self._connect()
             cursor = conn.cursor()
+            category_id = self._category_id(cursor, category)
             
-            cursor.execute('UPDATE users SET is_banned = 0 WHERE id = ? AND role = ?', 
-                          (user_id, 'user'))
+            # Check if discount already exists
+            cursor.execute('SELECT id FROM category_discounts WHERE category_id = ?', (category_id,))
+            existing = cursor.fetchone()
             
-            if cursor.rowcount == 0:
+            if existing:
+                # Update existing discount
+                cursor.execute('''
+                    UPDATE category_discounts 
+                    SET discount_percentage = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE category_id = ?
+                ''', (discount_percentage, category_id))
+                message = "Discount updated successfully"
+            else:
+                # Insert new discount
+                cursor.execute('''
+                    INSERT INTO category_discounts (category_id, discount_percentage)
+                    VALUES (?, ?)
+                ''', (category_id, discount_percentage))
+                message = "Discount added successfully"
+            
+            self._refresh_effective_prices(cursor, 'b.category_id = :category_id', {'category_id': category_id})
+            conn.commit()
+            conn.close()
+            return True, message
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def get_category_discounts(self):
+        """Get all category discounts"""
+        try:
+            def load():
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT d.id, c.name, d.discount_percentage, d.updated_at
+                    FROM category_discounts d
+                    JOIN categories c ON c.id = d.category_id
+                    ORDER BY c.name
+                ''')
+                
+                discounts = cursor.fetchall()
                 conn.close()
-                return False, "User not found or cannot unban this user"
+                return discounts
+            
+            return True, self._cached_read(('category_discounts',), ('categories', 'category_discounts'), load)
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def get_category_discount(self, category):
+        """Get discount for a specific category"""
+        try:
+            def load():
+                conn = self._connect()
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT c.name, d.discount_percentage
+                    FROM category_discounts d
+                    JOIN categories c ON c.id = d.category_id
+                ''')
+                
+                discounts = dict(cursor.fetchall())
+                conn.close()
+                return discounts
+            
+            # One cached map serves every category lookup
+            discounts = self._cached_read(('discount_map',), ('categories', 'category_discounts'), load)
+            return True, discounts.get(category, 0)  # 0 means no discount
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def delete_category_discount(self, category):
+        """Delete discount for a category"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                DELETE FROM category_discounts
+                WHERE category_id = (SELECT id FROM categories WHERE name = ?)
+            ''', (category,))
+            self._refresh_effective_prices(
+                cursor, 'b.category_id = (SELECT id FROM categories WHERE name = :category)',
+                {'category': category})
             
             conn.commit()
             conn.close()
+            return True, "Discount removed successfully"
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def schedule_discount(self, discount_percentage, starts_at=None, ends_at=None, category=None, book_id=None):
+        """Queue a discount window for a category or a single book (UTC 'YYYY-MM-DD HH:MM:SS')"""
+        try:
+            if discount_percentage < 0 or discount_percentage > 100:
+                return False, "Discount must be between 0 and 100"
+            if (category is None) == (book_id is None):
+                return False, "Choose either a category or a book"
+            if starts_at and ends_at and ends_at <= starts_at:
+                return False, "Discount must end after it starts"
+            
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            category_id = self._category_id(cursor, category) if category is not None else None
+            cursor.execute('''
+                INSERT INTO scheduled_discounts (category_id, book_id, discount_percentage, starts_at, ends_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (category_id, book_id, discount_percentage, starts_at, ends_at))
+            
+            if book_id is not None:
+                self._refresh_effective_prices(cursor, 'b.id = :book_id', {'book_id': book_id})
+            else:
+                self._refresh_effective_prices(cursor, 'b.category_id = :category_id', {'category_id': category_id})
+            
+            conn.commit()
+            conn.close()
+            return True, "Discount scheduled successfully"
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def get_scheduled_discounts(self):
+        """Get scheduled discounts that have not ended yet"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT s.id, c.name, s.book_id, b.title, s.discount_percentage, s.starts_at, s.ends_at
+                FROM scheduled_discounts s
+                LEFT JOIN categories c ON s.category_id = c.id
+                LEFT JOIN books b ON s.book_id = b.id
+                WHERE s.ends_at IS NULL OR s.ends_at > ?
+                ORDER BY COALESCE(s.starts_at, ''), s.id
+            ''', (self._utc_now(),))
+            
+            discounts = cursor.fetchall()
+            conn.close()
+            return True, discounts
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def delete_scheduled_discount(self, discount_id):
+        """Delete a scheduled discount"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM scheduled_discounts WHERE id = ?', (discount_id,))
+            self._refresh_effective_prices(cursor)
+            
+            conn.commit()
+            conn.close()
+            return True, "Scheduled discount removed successfully"
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def refresh_effective_prices(self):
+        """Recompute every book's final price for the discounts in effect now"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            self._refresh_effective_prices(cursor)
+            
+            conn.commit()
+            conn.close()
+            self._next_price_change = self._find_next_price_change()
+            return True, "Prices refreshed"
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    def get_next_price_change(self):
+        """Return when the next scheduled discount window opens or closes (UTC), or None"""
+        self._sync_next_price_change()
+        return self._next_price_change
+    
+    def _refresh_effective_prices(self, cursor, where="1", params=None):
+        """Rewrite effective_prices rows for books matching where, inside the caller's transaction"""
+        params = dict(params or {}, now=self._utc_now())
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO effective_prices (book_id, base_cents, discount_percentage, final_cents, category_id)
+            SELECT id, price_cents, discount,
+                   price_cents - {DISCOUNT_CENTS_SQL.format(cents='price_cents', percentage='discount')}, category_id
+            FROM (
+                SELECT b.id, b.price_cents, b.category_id, {self.EFFECTIVE_DISCOUNT_SQL} AS discount
+                FROM books b
+                WHERE {where}
+            )
+        ''', params)
+    
+    def _ensure_effective_prices(self):
+        """Refresh effective prices if a discount window opened or closed since the last refresh"""
+        self._sync_next_price_change()
+        if self._next_price_change is not None and self._next_price_change <= self._utc_now():
+            self.refresh_effective_prices()
+    
+    def _sync_next_price_change(self):
+        version = self._sync_table_versions().get('scheduled_discounts')
+        if version != self._schedule_version:
+            self._next_price_change = self._find_next_price_change()
+            self._schedule_version = version
+    
+    def _find_next_price_change(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        now = self._utc_now()
+        cursor.execute('''
+            SELECT MIN(t) FROM (
+                SELECT MIN(starts_at) AS t FROM scheduled_discounts WHERE starts_at > ?
+                UNION ALL
+                SELECT MIN(ends_at) FROM scheduled_discounts WHERE ends_at > ?
+            )
+        ''', (now, now))
+        next_change = cursor.fetchone()[0]
+        conn.close()
+        return next_change
+    
+    @staticmethod
+    def _utc_now():
+        """Current time in the format SQLite uses for CURRENT_TIMESTAMP"""
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    
+    # User management methods
+    
+    @instrumented
+    def get_all_users(self):
+        """Get all non-admin users"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, username, email, is_banned, created_at
+                FROM users
+                WHERE role = 'user'
+                ORDER BY username
+            ''')
+            
+            users = cursor.fetchall()
+            conn.close()
+            return True, users
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def search_users(self, prefix="", field='username', banned=None, created_from=None,
+                     created_to=None, after=None, limit=100):
+        """Find non-admin users whose username (or email) starts with prefix, case-insensitively.
+        
+        Results are ordered by that field and paged by keyset: pass the returned cursor as
+        after for the next page. Returns ((id, username, email, is_banned, created_at) rows,
+        cursor or None after the last page).
+        """
+        if field not in ('username', 'email'):
+            return False, f"Unknown field: {field}"
+        
+        try:
+            key = f'lower({field})'
+            conditions = ["role = 'user'"]
+            params = {'limit': limit}
+            prefix = prefix.strip().translate(self.ASCII_LOWER)
+            if prefix:
+                # Range scan on the lower() index; a LIKE would not use it
+                conditions.append(f'{key} >= :prefix AND {key} < :prefix_end')
+                params['prefix'] = prefix
+                params['prefix_end'] = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            if banned is not None:
+                conditions.append('is_banned = :banned')
+                params['banned'] = 1 if banned else 0
+            if created_from is not None:
+                conditions.append('created_at >= :created_from')
+                params['created_from'] = created_from
+            if created_to is not None:
+                conditions.append('created_at < :created_to')
+                params['created_to'] = created_to
+            if after is not None:
+                # Spelled out because a row-value comparison cannot seek the lower() index
+                conditions.append(f'{key} >= :after_key AND ({key} > :after_key OR id > :after_id)')
+                params['after_key'], params['after_id'] = after
+            
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT id, username, email, is_banned, created_at, {key}
+                FROM users
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {key}, id
+                LIMIT :limit
+            ''', params)
+            
+            rows = cursor.fetchall()
+            conn.close()
+            
+            next_after = (rows[-1][5], rows[-1][0]) if len(rows) == limit else None
+            return True, ([row[:5] for row in rows], next_after)
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def ban_user(self, user_id):
+        """Ban a user account"""
+        try:
+            if not self._set_banned([user_id], True):
+                return False, "User not found or cannot ban this user"
+            
+            return True, "User banned successfully"
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def unban_user(self, user_id):
+        """Unban a user account"""
+        try:
+            if not self._set_banned([user_id], False):
+                return False, "User not found or cannot unban this user"
+            
             return True, "User unbanned successfully"
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @instrumented
     def is_user_banned(self, username):
         """Check if a user is banned"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('SELECT is_banned FROM users WHERE username = ?', (username,))
@@ -474,22 +1542,152 @@ class AuthDatabase:
         except sqlite3.Error as e:
             return False
     
+    @instrumented
+    def ban_users(self, user_ids, actor_id=None, message=None):
+        """Ban many users in one transaction, optionally notifying each; returns the banned ids"""
+        try:
+            return True, self._set_banned(user_ids, True, actor_id, message)
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def unban_users(self, user_ids, actor_id=None, message=None):
+        """Unban many users in one transaction, optionally notifying each; returns the unbanned ids"""
+        try:
+            return True, self._set_banned(user_ids, False, actor_id, message)
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    def _set_banned(self, user_ids, banned, actor_id=None, message=None):
+        """Set is_banned on the given non-admin users and notify them, all in one transaction"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            previous_version = self._table_version(cursor, 'users')
+            
+            # json_each avoids SQLite's bound-parameter limit for long id lists
+            cursor.execute('''
+                UPDATE users SET is_banned = ?
+                WHERE id IN (SELECT value FROM json_each(?)) AND role = 'user'
+                RETURNING id
+            ''', (1 if banned else 0, json.dumps(list(user_ids))))
+            changed = [row[0] for row in cursor.fetchall()]
+            
+            if message and changed:
+                self._insert_targeted_notifications(cursor, actor_id, message, changed)
+            
+            users_version = self._table_version(cursor, 'users')
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if banned:
+            self._update_banned_users(previous_version, users_version, lambda ids: ids.update(changed))
+        else:
+            self._update_banned_users(previous_version, users_version, lambda ids: ids.difference_update(changed))
+        return changed
+    
+    def is_user_id_banned(self, user_id):
+        """Check a user id against the in-memory banned set (no query unless users changed)"""
+        return user_id in self._banned_user_ids()
+    
+    def _banned_user_ids(self):
+        """Return the banned user ids, reloading them after writes to users elsewhere"""
+        version = self._sync_table_versions().get('users')
+        with self._banned_lock:
+            if self._banned_users[0] != version:
+                conn = self._connect()
+                cursor = conn.cursor()
+                cursor.execute('SELECT id FROM users WHERE is_banned = 1')
+                self._banned_users = (version, {row[0] for row in cursor.fetchall()})
+                conn.close()
+            return self._banned_users[1]
+    
+    def _update_banned_users(self, previous_version, version, update):
+        """Apply our own committed ban change to the set if it had seen every earlier users write"""
+        with self._banned_lock:
+            seen_version, banned = self._banned_users
+            if seen_version == previous_version:
+                banned = set(banned)
+                update(banned)
+                self._banned_users = (version, banned)
+    
+    @instrumented
     def search_books(self, search_query):
         """Search books by title, author, or category"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             # Search with wildcard pattern
             search_pattern = f"%{search_query}%"
             
+            self._ensure_effective_prices()
             cursor.execute('''
-                SELECT id, title, author, category, price, description
-                FROM books
-                WHERE title LIKE ? OR author LIKE ? OR category LIKE ?
-                ORDER BY category, title
+                SELECT b.id, b.title, a.name, c.name, b.price_cents, b.description,
+                       COALESCE(e.discount_percentage, 0), COALESCE(e.final_cents, b.price_cents)
+                FROM books b
+                JOIN authors a ON a.id = b.author_id
+                JOIN categories c ON c.id = b.category_id
+                LEFT JOIN effective_prices e ON e.book_id = b.id
+                WHERE b.title LIKE ? OR a.name LIKE ? OR c.name LIKE ?
+                ORDER BY c.name, b.title
             ''', (search_pattern, search_pattern, search_pattern))
             
+            books = cursor.fetchall()
+            conn.close()
+            
+            if len(books) < self.FUZZY_FALLBACK_THRESHOLD:
+                # Few exact hits: likely a typo, so add close title/author matches
+                found = {book[0] for book in books}
+                f_success, fuzzy = self.fuzzy_search_books(search_query)
+                if f_success:
+                    books += [book for book in fuzzy if book[0] not in found]
+            return True, books
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def fuzzy_search_books(self, search_query, limit=20):
+        """Search titles and authors allowing typos, best trigram matches first"""
+        try:
+            query_trigrams = self._trigrams(search_query)
+            if not query_trigrams:
+                return True, []
+            
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            self._ensure_effective_prices()
+            # Rank by the share of query trigrams found, then prefer shorter titles/authors
+            cursor.execute('''
+                WITH matches AS (
+                    SELECT t.book_id, COUNT(*) AS shared
+                    FROM book_trigrams t
+                    WHERE t.trigram IN (SELECT value FROM json_each(:trigrams))
+                    GROUP BY t.book_id
+                    HAVING COUNT(*) >= :min_shared
+                )
+                SELECT b.id, b.title, a.name, c.name, b.price_cents, b.description,
+                       COALESCE(e.discount_percentage, 0), COALESCE(e.final_cents, b.price_cents)
+                FROM matches m
+                JOIN book_trigram_counts n ON n.book_id = m.book_id
+                JOIN books b ON b.id = m.book_id
+                JOIN authors a ON a.id = b.author_id
+                JOIN categories c ON c.id = b.category_id
+                LEFT JOIN effective_prices e ON e.book_id = b.id
+                ORDER BY m.shared DESC, n.trigram_count, b.title
+                LIMIT :limit
+            ''', {
+                'trigrams': json.dumps(sorted(query_trigrams)),
+                'min_shared': max(1, round(len(query_trigrams) * self.FUZZY_MIN_SIMILARITY)),
+                'limit': limit,
+            })
+            
             books = cursor.fetchall()
             conn.close()
             return True, books
@@ -497,23 +1695,190 @@ class AuthDatabase:
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @instrumented
+    def faceted_search(self, search_query="", category=None, price_bucket=None, rating_bucket=None,
+                       page=0, page_size=50):
+        """Search books and count the matches per category, price bucket and rating bucket.
+        
+        Filters are facet labels. Each facet's counts apply every other filter but its own,
+        so they show how many results choosing that value would give. Returns
+        {'total': matches after filtering, 'books': the page's search_books rows,
+         'facets': {'category'|'price'|'rating': [(label, count)]}}.
+        """
+        try:
+            matches = self._facet_matches(search_query.strip())
+            filters = {'category': category, 'price': price_bucket, 'rating': rating_bucket}
+            counts = {facet: {} for facet in filters}
+            selected = []
+            
+            # One pass over the matched (id, category, price bucket, rating bucket) rows
+            for match in matches:
+                values = {'category': match[1], 'price': match[2], 'rating': match[3]}
+                failed = [facet for facet, wanted in filters.items()
+                          if wanted is not None and values[facet] != wanted]
+                if not failed:
+                    selected.append(match[0])
+                for facet in filters:
+                    if not failed or failed == [facet]:
+                        counts[facet][values[facet]] = counts[facet].get(values[facet], 0) + 1
+            
+            price_order = [label for label, _low, _high in self.PRICE_BUCKETS]
+            rating_order = [label for label, _low, _high in self.RATING_BUCKETS] + [self.UNRATED]
+            facets = {
+                'category': sorted(counts['category'].items()),
+                'price': [(label, counts['price'][label]) for label in price_order if label in counts['price']],
+                'rating': [(label, counts['rating'][label]) for label in rating_order if label in counts['rating']],
+            }
+            
+            page_ids = selected[page * page_size:(page + 1) * page_size]
+            return True, {'total': len(selected), 'books': self._load_search_rows(page_ids), 'facets': facets}
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    def _facet_matches(self, search_query):
+        """(id, category, price bucket, rating bucket) of every match.
+        
+        Only the latest query is kept, so narrowing its facets never re-runs the search.
+        """
+        versions = self._sync_table_versions()
+        version = tuple(versions.get(table) for table in
+                        ('books', 'authors', 'categories', 'effective_prices', 'book_ratings'))
+        cached = self.read_cache.get(('facet_matches',), version)
+        if cached is not None and cached[0] == search_query:
+            return cached[1]
+        
+        def load():
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            self._ensure_effective_prices()
+            select = '''
+                SELECT b.id, c.name, COALESCE(e.final_cents, b.price_cents),
+                       CAST(r.rating_sum AS REAL) / NULLIF(r.rating_count, 0)
+                FROM books b
+                JOIN authors a ON a.id = b.author_id
+                JOIN categories c ON c.id = b.category_id
+                LEFT JOIN effective_prices e ON e.book_id = b.id
+                LEFT JOIN book_ratings r ON r.book_id = b.id
+            '''
+            if search_query:
+                search_pattern = f"%{search_query}%"
+                cursor.execute(select + '''
+                    WHERE b.title LIKE ? OR a.name LIKE ? OR c.name LIKE ?
+                    ORDER BY c.name, b.title
+                ''', (search_pattern, search_pattern, search_pattern))
+            else:
+                cursor.execute(select + ' ORDER BY c.name, b.title')
+            rows = cursor.fetchall()
+            
+            if search_query and len(rows) < self.FUZZY_FALLBACK_THRESHOLD:
+                # Same typo fallback as search_books
+                found = {row[0] for row in rows}
+                f_success, fuzzy = self.fuzzy_search_books(search_query)
+                fuzzy_ids = [book[0] for book in fuzzy if book[0] not in found] if f_success else []
+                if fuzzy_ids:
+                    cursor.execute(select + '''
+                        WHERE b.id IN (SELECT value FROM json_each(?))
+                    ''', (json.dumps(fuzzy_ids),))
+                    by_id = {row[0]: row for row in cursor.fetchall()}
+                    rows += [by_id[book_id] for book_id in fuzzy_ids if book_id in by_id]
+            conn.close()
+            
+            return [(book_id, category, self._bucket(self.PRICE_BUCKETS, final_cents),
+                     self._bucket(self.RATING_BUCKETS, rating) if rating is not None else self.UNRATED)
+                    for book_id, category, final_cents, rating in rows]
+        
+        matches = load()
+        self.read_cache.put(('facet_matches',), version, (search_query, matches))
+        return matches
+    
+    @staticmethod
+    def _bucket(buckets, value):
+        for label, low, high in buckets:
+            if value >= low and (high is None or value < high):
+                return label
+        return buckets[-1][0]
+    
+    def _load_search_rows(self, book_ids):
+        """search_books rows for book_ids, in the given order"""
+        if not book_ids:
+            return []
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT b.id, b.title, a.name, c.name, b.price_cents, b.description,
+                   COALESCE(e.discount_percentage, 0), COALESCE(e.final_cents, b.price_cents)
+            FROM books b
+            JOIN authors a ON a.id = b.author_id
+            JOIN categories c ON c.id = b.category_id
+            LEFT JOIN effective_prices e ON e.book_id = b.id
+            WHERE b.id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(book_ids),))
+        
+        by_id = {row[0]: row for row in cursor.fetchall()}
+        conn.close()
+        return [by_id[book_id] for book_id in book_ids if book_id in by_id]
+    
+    @staticmethod
+    def _trigrams(text):
+        """Trigrams of each word padded like pg_trgm ("  w", " wo", "wor", "ord", "rd ")"""
+        trigrams = set()
+        for word in re.findall(r'\w+', text.lower()):
+            padded = f"  {word} "
+            trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return trigrams
+    
+    def _index_trigrams(self, cursor, books):
+        """Add the title and author trigrams of (id, title, author) rows to the trigram index"""
+        postings = []
+        counts = []
+        for book_id, title, author in books:
+            trigrams = self._trigrams(f"{title} {author}")
+            postings.extend((trigram, book_id) for trigram in trigrams)
+            counts.append((book_id, len(trigrams)))
+        cursor.executemany('INSERT OR IGNORE INTO book_trigrams (trigram, book_id) VALUES (?, ?)', postings)
+        cursor.executemany('''
+            INSERT OR REPLACE INTO book_trigram_counts (book_id, trigram_count) VALUES (?, ?)
+        ''', counts)
+    
     # Purchase management methods
     
+    @instrumented
     def purchase_book(self, user_id, book_id):
         """Record a book purchase for a user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            if self.is_user_id_banned(user_id):
+                return False, "Your account has been banned"
+            owned = self.get_owned_book_ids(user_id)
+            if book_id in owned:
+                return False, "You have already purchased this book"
+            
+            conn = self._connect()
             cursor = conn.cursor()
             
-            # Get book details and price
-            cursor.execute('SELECT title, category, price FROM books WHERE id = ?', (book_id,))
+            # Get book details and the price in effect right now (category, window or
+            # per-book discount), computed by the same SQL that fills effective_prices
+            cursor.execute(f'''
+                SELECT title, price_cents,
+                       price_cents - {DISCOUNT_CENTS_SQL.format(cents='price_cents', percentage='discount')}
+                FROM (
+                    SELECT b.title, b.price_cents, {self.EFFECTIVE_DISCOUNT_SQL} AS discount
+                    FROM books b
+                    WHERE b.id = :book_id
+                )
+            ''', {'now': self._utc_now(), 'book_id': book_id})
             book_result = cursor.fetchone()
             
             if not book_result:
                 conn.close()
                 return False, "Book not found"
             
-            title, category, price = book_result
+            title, price_cents, final_cents = book_result
+            price = Money(price_cents)
+            final_price = Money(final_cents)
+            discount_amount = price - final_price
             
             # Check if user already bought this book
             cursor.execute('''
@@ -525,44 +1890,226 @@ class AuthDatabase:
                 conn.close()
                 return False, "You have already purchased this book"
             
-            # Get discount for this category
+            # Record the purchase
             cursor.execute('''
-                SELECT discount_percentage FROM category_discounts
-                WHERE category = ?
-            ''', (category,))
+                INSERT INTO purchases (user_id, book_id, purchase_price_cents, discount_applied_cents, final_price_cents)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, book_id, price.cents, discount_amount.cents, final_price.cents))
             
-            discount_result = cursor.fetchone()
-            discount_percentage = discount_result[0] if discount_result else 0
+            # Pair the new book with everything the user already owns, in both directions
+            cursor.execute('''
+                INSERT INTO co_purchases (book_id, other_book_id, purchase_count)
+                SELECT * FROM (
+                    SELECT :book_id, value, 1 FROM json_each(:owned)
+                    UNION ALL
+                    SELECT value, :book_id, 1 FROM json_each(:owned)
+                ) WHERE true
+                ON CONFLICT (book_id, other_book_id) DO UPDATE SET purchase_count = purchase_count + 1
+            ''', {'book_id': book_id, 'owned': json.dumps(sorted(owned))})
+            purchases_version = self._table_version(cursor, 'purchases')
             
-            # Calculate final price
-            discount_amount = price * (discount_percentage / 100)
-            final_price = price - discount_amount
+            conn.commit()
+            conn.close()
+            
+            self._update_entitlements(user_id, purchases_version, book_id)
+            
+            return True, f"Successfully purchased '{title}' for {final_price}"
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def get_also_bought(self, book_id, limit=5):
+        """Get books most often bought together with book_id as (id, title, buyers)"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
             
-            # Record the purchase
             cursor.execute('''
-                INSERT INTO purchases (user_id, book_id, purchase_price, discount_applied, final_price)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, book_id, price, discount_amount, final_price))
+                SELECT b.id, b.title, cp.purchase_count
+                FROM co_purchases cp
+                JOIN books b ON b.id = cp.other_book_id
+                WHERE cp.book_id = ?
+                ORDER BY cp.purchase_count DESC, cp.other_book_id DESC
+                LIMIT ?
+            ''', (book_id, limit))
             
+            books = cursor.fetchall()
+            conn.close()
+            return True, books
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def rebuild_co_purchases(self):
+        """Recompute co-purchase counts from the purchases table"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            self._rebuild_co_purchases(cursor)
+            cursor.execute('SELECT COUNT(*) FROM co_purchases')
+            pairs = cursor.fetchone()[0]
             conn.commit()
             conn.close()
+            return True, pairs
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @staticmethod
+    def _rebuild_co_purchases(cursor):
+        cursor.execute('DELETE FROM co_purchases')
+        cursor.execute('''
+            INSERT INTO co_purchases (book_id, other_book_id, purchase_count)
+            SELECT p.book_id, other.book_id, COUNT(DISTINCT p.user_id)
+            FROM purchases p
+            JOIN purchases other ON other.user_id = p.user_id AND other.book_id != p.book_id
+            WHERE p.book_id IN (SELECT id FROM books) AND other.book_id IN (SELECT id FROM books)
+            GROUP BY p.book_id, other.book_id
+        ''')
+    
+    # Content similarity methods
+    
+    @instrumented
+    def get_similar_books(self, book_id, limit=5):
+        """Get the books whose text is most similar to book_id as (id, title, score)"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT b.id, b.title, s.score
+                FROM similar_books s
+                JOIN books b ON b.id = s.similar_book_id
+                WHERE s.book_id = ?
+                ORDER BY s.score DESC, s.similar_book_id DESC
+                LIMIT ?
+            ''', (book_id, limit))
+            
+            books = cursor.fetchall()
+            conn.close()
+            return True, books
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def rebuild_similar_books(self, top_k=None):
+        """Recompute every book's TF-IDF vector and most similar books; returns books indexed.
+        
+        Content is read one stored chunk at a time and only each book's most frequent words
+        are kept, so memory stays bounded however large the books are.
+        """
+        top_k = top_k or self.SIMILAR_TOP_K
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id, title, description FROM books')
+            documents = {}
+            for book_id, title, description in cursor.fetchall():
+                chunks = self._content_chunks(conn.cursor(), book_id)
+                documents[book_id] = term_counts(chain([title, " ", description or "", " "], chunks))
+            
+            vectors, similar = build_similarities(documents, top_k)
+            book_ids = json.dumps(list(documents))
             
-            return True, f"Successfully purchased '{title}' for ${final_price:.2f}"
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('DELETE FROM book_terms WHERE book_id IN (SELECT value FROM json_each(?))', (book_ids,))
+            cursor.execute('DELETE FROM similar_books WHERE book_id IN (SELECT value FROM json_each(?))', (book_ids,))
+            cursor.executemany('''
+                INSERT INTO book_terms (book_id, term, term_count, weight) VALUES (?, ?, ?, ?)
+            ''', ((book_id, term, count, vectors[book_id].get(term, 0.0))
+                  for book_id, counts in documents.items() for term, count in counts.items()))
+            cursor.executemany('''
+                INSERT INTO similar_books (book_id, similar_book_id, score) VALUES (?, ?, ?)
+            ''', ((book_id, other_id, score)
+                  for book_id, others in similar.items() for other_id, score in others))
+            conn.commit()
+            conn.close()
+            return True, len(documents)
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @staticmethod
+    def _content_chunks(cursor, book_id):
+        """Yield a book's content one stored chunk at a time"""
+        cursor.execute('''
+            SELECT ch.text
+            FROM books b JOIN book_content_chunks ch ON ch.digest = b.content_digest
+            WHERE b.id = ?
+            ORDER BY ch.seq
+        ''', (book_id,))
+        for (text,) in cursor:
+            yield text
+    
+    def _index_similar_book(self, cursor, book_id, counts):
+        """Vectorise a new book against the stored document frequencies and link it to its
+        most similar books. Other books keep their vectors until the next rebuild.
+        """
+        terms = json.dumps(list(counts))
+        cursor.execute('''
+            SELECT term, COUNT(*) FROM book_terms
+            WHERE term IN (SELECT value FROM json_each(?))
+            GROUP BY term
+        ''', (terms,))
+        doc_freq = {term: doc_count + 1 for term, doc_count in cursor.fetchall()}
+        doc_freq.update((term, 1) for term in counts if term not in doc_freq)
+        cursor.execute('SELECT COUNT(*) FROM books')
+        vector = vectorize(counts, doc_freq, cursor.fetchone()[0])
+        
+        cursor.executemany('''
+            INSERT OR REPLACE INTO book_terms (book_id, term, term_count, weight) VALUES (?, ?, ?, ?)
+        ''', [(book_id, term, count, vector.get(term, 0.0)) for term, count in counts.items()])
+        
+        cursor.execute('''
+            SELECT bt.book_id, SUM(bt.weight * v.value) AS score
+            FROM json_each(:vector) v
+            JOIN book_terms bt ON bt.term = v.key
+            WHERE bt.book_id != :book_id
+            GROUP BY bt.book_id
+            HAVING score > 0
+            ORDER BY score DESC, bt.book_id
+            LIMIT :top_k
+        ''', {'vector': json.dumps(vector), 'book_id': book_id, 'top_k': self.SIMILAR_TOP_K})
+        similar = cursor.fetchall()
+        if not similar:
+            return
+        
+        # Link both ways, then trim the other books back to their best SIMILAR_TOP_K
+        cursor.executemany('''
+            INSERT OR REPLACE INTO similar_books (book_id, similar_book_id, score) VALUES (?, ?, ?)
+        ''', [(book_id, other_id, score) for other_id, score in similar]
+              + [(other_id, book_id, score) for other_id, score in similar])
+        cursor.execute('''
+            DELETE FROM similar_books WHERE (book_id, similar_book_id) IN (
+                SELECT book_id, similar_book_id FROM (
+                    SELECT book_id, similar_book_id,
+                           ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY score DESC) AS position
+                    FROM similar_books
+                    WHERE book_id IN (SELECT value FROM json_each(:others))
+                )
+                WHERE position > :top_k
+            )
+        ''', {'others': json.dumps([other_id for other_id, _score in similar]), 'top_k': self.SIMILAR_TOP_K})
+    
+    @instrumented
     def get_user_purchases(self, user_id):
         """Get all purchases for a specific user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT p.id, b.title, b.author, b.category, p.purchase_price, 
-                       p.discount_applied, p.final_price, p.purchase_date
+                SELECT p.id, p.book_id, b.title, a.name, c.name, p.purchase_price_cents, 
+                       p.discount_applied_cents, p.final_price_cents, p.purchase_date
                 FROM purchases p
                 JOIN books b ON p.book_id = b.id
+                JOIN authors a ON a.id = b.author_id
+                JOIN categories c ON c.id = b.category_id
                 WHERE p.user_id = ?
                 ORDER BY p.purchase_date DESC
             ''', (user_id,))
@@ -574,54 +2121,282 @@ class AuthDatabase:
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
-    def get_book_by_id(self, book_id):
-        """Get book details by ID"""
+    @instrumented
+    def get_sales_totals(self):
+        """Get exact sales totals in cents: (sales, gross, discounts, revenue)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT id, title, author, category, price, description, content
-                FROM books
-                WHERE id = ?
-            ''', (book_id,))
+                SELECT COUNT(*), COALESCE(SUM(purchase_price_cents), 0),
+                       COALESCE(SUM(discount_applied_cents), 0), COALESCE(SUM(final_price_cents), 0)
+                FROM purchases
+            ''')
             
-            book = cursor.fetchone()
+            totals = cursor.fetchone()
             conn.close()
-            return True, book
+            return True, totals
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def load_entitlements(self, user_id):
+        """Load the set of book ids a user owns (call once at login)"""
+        try:
+            version = self._sync_table_versions().get('purchases')
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT book_id FROM purchases WHERE user_id = ?', (user_id,))
+            
+            owned = {row[0] for row in cursor.fetchall()}
+            conn.close()
+            self._entitlements[user_id] = (version, owned)
+            return True, owned
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    def get_owned_book_ids(self, user_id):
+        """Get the ids of books a user owns, served from memory after login"""
+        entry = self._entitlements.get(user_id)
+        if entry is None or entry[0] != self._sync_table_versions().get('purchases'):
+            # Not loaded yet, or purchases changed elsewhere since loading
+            success, owned = self.load_entitlements(user_id)
+            return owned if success else set()
+        return entry[1]
+    
+    def _update_entitlements(self, user_id, version, book_id):
+        """Add our own committed purchase to a loaded set if it had seen every earlier purchases write"""
+        entry = self._entitlements.get(user_id)
+        if entry is None:
+            return
+        if entry[0] == version - 1:
+            self._entitlements[user_id] = (version, entry[1] | {book_id})
+        else:
+            # Purchases changed elsewhere meanwhile; reload on next use
+            self._entitlements.pop(user_id, None)
+    
+    def user_owns_book(self, user_id, book_id):
+        """Check whether a user has purchased a book"""
+        return book_id in self.get_owned_book_ids(user_id)
+    
+    def release_entitlements(self, user_id):
+        """Forget a user's owned books (call at logout)"""
+        self._entitlements.pop(user_id, None)
+    
+    @instrumented
+    def get_book_by_id(self, book_id):
+        """Get book details by ID"""
+        try:
+            return True, self._load_book(book_id)
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
     
+    @instrumented
     def get_book_content(self, book_id):
         """Get book content for reading"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            book = self._load_book(book_id)
+            
+            if book:
+                _id, title, author, category, price, description, content = book
+                return True, (title, author, content)
+            else:
+                return False, "Book not found"
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def get_reader_info(self, book_id):
+        """Get (title, author, content length in characters) without loading the content"""
+        try:
+            conn = self._connect()
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT title, author, content
-                FROM books
-                WHERE id = ?
+                SELECT b.title, a.name, bc.size
+                FROM books b
+                JOIN authors a ON a.id = b.author_id
+                JOIN book_contents bc ON bc.digest = b.content_digest
+                WHERE b.id = ?
             ''', (book_id,))
             
-            result = cursor.fetchone()
+            book = cursor.fetchone()
             conn.close()
             
-            if result:
-                return True, result
+            if book:
+                title, author, length = book
+                return True, (title, author, length or 0)
             else:
                 return False, "Book not found"
         
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def get_book_text(self, book_id, start, length):
+        """Get length characters of a book's content from offset start"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            # Only the chunk rows overlapping [start, start + length) are read
+            first = start // self.CONTENT_CHUNK_CHARS
+            cursor.execute('''
+                SELECT ch.text
+                FROM books b JOIN book_content_chunks ch ON ch.digest = b.content_digest
+                WHERE b.id = ? AND ch.seq BETWEEN ? AND ?
+                ORDER BY ch.seq
+            ''', (book_id, first, (start + max(length, 1) - 1) // self.CONTENT_CHUNK_CHARS))
+            
+            text = "".join(text for (text,) in cursor.fetchall())
+            conn.close()
+            offset = start - first * self.CONTENT_CHUNK_CHARS
+            return True, text[offset:offset + length]
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    def _load_book(self, book_id):
+        """Read a full book row; the text comes through the byte-bounded content cache"""
+        def load():
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT b.id, b.title, a.name, c.name, b.price_cents, b.description, b.content_digest
+                FROM books b
+                JOIN authors a ON a.id = b.author_id
+                JOIN categories c ON c.id = b.category_id
+                WHERE b.id = ?
+            ''', (book_id,))
+            
+            book = cursor.fetchone()
+            conn.close()
+            return book or ()
+        
+        book = self._cached_read(('book', book_id), ('books', 'authors', 'categories'), load)
+        if not book:
+            return None
+        return book[:6] + (self._load_content(book[6]),)
+    
+    def _load_content(self, digest):
+        """Read a book text by digest; texts never change, so cached ones never go stale"""
+        key = ('content', digest)
+        content = self.book_cache.get(key)
+        if content is not None:
+            return content
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT text FROM book_content_chunks WHERE digest = ? ORDER BY seq', (digest,))
+        content = "".join(text for (text,) in cursor.fetchall())
+        conn.close()
+        
+        self.book_cache.put(key, content)
+        return content
+    
+    def _store_content(self, cursor, content):
+        """Add a reference to a text, storing it if new; returns its digest"""
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        cursor.execute('''
+            INSERT INTO book_contents (digest, size, ref_count) VALUES (?, ?, 1)
+            ON CONFLICT (digest) DO UPDATE SET ref_count = ref_count + 1
+            RETURNING ref_count
+        ''', (digest, len(content)))
+        if cursor.fetchone()[0] == 1:
+            self._store_chunks(cursor, digest, content)
+        return digest
+    
+    def _store_chunks(self, cursor, digest, content):
+        """Write a new text as rows of CONTENT_CHUNK_CHARS characters"""
+        size = self.CONTENT_CHUNK_CHARS
+        cursor.executemany('INSERT INTO book_content_chunks (digest, seq, text) VALUES (?, ?, ?)',
+                           ((digest, seq, content[seq * size:(seq + 1) * size])
+                            for seq in range((len(content) + size - 1) // size)))
+    
+    @staticmethod
+    def _release_content(cursor, digest):
+        """Drop a reference to a text, deleting it with the last one; returns True if deleted"""
+        cursor.execute('UPDATE book_contents SET ref_count = ref_count - 1 WHERE digest = ?', (digest,))
+        cursor.execute('DELETE FROM book_contents WHERE digest = ? AND ref_count <= 0', (digest,))
+        if cursor.rowcount == 0:
+            return False
+        cursor.execute('DELETE FROM book_content_chunks WHERE digest = ?', (digest,))
+        return True
 
+    # Reading progress methods
+    
+    def update_reading_position(self, user_id, book_id, position):
+        """Remember a reading position in memory; flush_reading_progress writes it"""
+        with self._progress_lock:
+            self._pending_progress[(user_id, book_id)] = position
+    
+    @instrumented
+    def flush_reading_progress(self):
+        """Write all pending reading positions in one transaction; returns how many"""
+        with self._progress_lock:
+            pending, self._pending_progress = self._pending_progress, {}
+        if not pending:
+            return True, 0
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO reading_progress (user_id, book_id, position, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id, book_id) DO UPDATE
+                SET position = excluded.position, updated_at = excluded.updated_at
+            ''', [(user_id, book_id, position) for (user_id, book_id), position in pending.items()])
+            conn.commit()
+            conn.close()
+            return True, len(pending)
+        
+        except sqlite3.Error as e:
+            # Keep the positions for the next flush unless newer ones arrived meanwhile
+            with self._progress_lock:
+                for key, position in pending.items():
+                    self._pending_progress.setdefault(key, position)
+            return False, f"Database error: {str(e)}"
+    
+    @instrumented
+    def get_reading_position(self, user_id, book_id):
+        """Get where a user stopped reading a book (0 if never opened)"""
+        with self._progress_lock:
+            position = self._pending_progress.get((user_id, book_id))
+        if position is not None:
+            return True, position
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT position FROM reading_progress WHERE user_id = ? AND book_id = ?
+            ''', (user_id, book_id))
+            row = cursor.fetchone()
+            conn.close()
+            return True, row[0] if row else 0
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
     # Review management methods
 
+    @instrumented
     def add_review(self, user_id, book_id, review_text, rating=None):
-        """Add a review for a book by a user"""
+        """Add a review for a book by a user (optional rating 1-5)"""
+        if rating is not None and not 1 <= rating <= 5:
+            return False, "Rating must be between 1 and 5"
+        
         try:
-            conn = sqlite3.connect(self.db_path)
+            if self.is_user_id_banned(user_id):
+                return False, "Your account has been banned"
+            
+            conn = self._connect()
             cursor = conn.cursor()
 
             # Optionally ensure book exists
@@ -635,6 +2410,16 @@ class AuthDatabase:
                 INSERT INTO reviews (user_id, book_id, rating, review_text)
                 VALUES (?, ?, ?, ?)
             ''', (user_id, book_id, rating, review_text))
+            
+            if rating is not None:
+                cursor.execute('''
+                    INSERT INTO book_ratings (book_id, rating_count, rating_sum, rating_avg, category_id)
+                    SELECT id, 1, :rating, :rating, category_id FROM books WHERE id = :book_id
+                    ON CONFLICT(book_id) DO UPDATE SET
+                        rating_count = rating_count + 1,
+                        rating_sum = rating_sum + excluded.rating_sum,
+                        rating_avg = CAST(rating_sum + excluded.rating_sum AS REAL) / (rating_count + 1)
+                ''', {'book_id': book_id, 'rating': rating})
 
             conn.commit()
             conn.close()
@@ -643,10 +2428,11 @@ class AuthDatabase:
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
 
+    @instrumented
     def get_reviews_for_book(self, book_id):
         """Retrieve all reviews for a given book, including reviewer username"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             cursor.execute('''
@@ -666,10 +2452,11 @@ class AuthDatabase:
 
     # Notifications methods
 
+    @instrumented
     def add_notification(self, actor_id, message, broadcast=True, target_user_id=None):
         """Add a notification. If broadcast=True it targets all users, otherwise target_user_id must be set."""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
             is_broadcast = 1 if broadcast else 0
@@ -685,20 +2472,55 @@ class AuthDatabase:
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
 
+    @instrumented
+    def add_notifications_bulk(self, actor_id, message, target_user_ids):
+        """Send the same targeted notification to many users in one transaction"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            
+            self._insert_targeted_notifications(cursor, actor_id, message, target_user_ids)
+            count = cursor.rowcount
+            
+            conn.commit()
+            conn.close()
+            return True, count
+        
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+    
+    @staticmethod
+    def _insert_targeted_notifications(cursor, actor_id, message, target_user_ids):
+        cursor.executemany('''
+            INSERT INTO notifications (actor_id, message, is_broadcast, target_user_id)
+            VALUES (?, ?, 0, ?)
+        ''', [(actor_id, message, user_id) for user_id in target_user_ids])
+    
+    @instrumented
     def get_notifications_for_user(self, user_id, limit=100):
         """Retrieve notifications visible to a given user (broadcasts + targeted)."""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
 
+            # UNION ALL of two index scans instead of an OR that scans the whole table
             cursor.execute('''
                 SELECT n.id, n.actor_id, u.username as actor_username, n.message, n.is_broadcast, n.target_user_id, n.created_at
-                FROM notifications n
+                FROM (
+                    SELECT * FROM (
+                        SELECT * FROM notifications WHERE is_broadcast = 1
+                        ORDER BY created_at DESC LIMIT :limit
+                    )
+                    UNION ALL
+                    SELECT * FROM (
+                        SELECT * FROM notifications WHERE target_user_id = :user_id AND is_broadcast = 0
+                        ORDER BY created_at DESC LIMIT :limit
+                    )
+                ) n
                 LEFT JOIN users u ON n.actor_id = u.id
-                WHERE n.is_broadcast = 1 OR n.target_user_id = ?
-                ORDER BY n.created_at DESC
-                LIMIT ?
-            ''', (user_id, limit))
+                ORDER BY n.created_at DESC, n.id DESC
+                LIMIT :limit
+            ''', {'user_id': user_id, 'limit': limit})
 
             notes = cursor.fetchall()
             conn.close()
@@ -706,3 +2528,178 @@ class AuthDatabase:
 
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
+
+    # Maintenance methods
+
+    @instrumented
+    def archive_notifications(self, max_age_days=90, keep_per_user=200, batch_size=1000, archive_path=None):
+        """Move expired notifications to an archive database in batches.
+
+        A notification expires when it is older than max_age_days, or when it is not among
+        the newest keep_per_user notifications of its recipient (broadcasts count as one
+        recipient). The archive defaults to <db name>_archive.db next to the database.
+        Returns the number of rows moved.
+        """
+        if archive_path is None:
+            path = Path(self.db_path)
+            archive_path = str(path.with_name(f"{path.stem}_archive{path.suffix or '.db'}"))
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS archive.notifications (
+                    id INTEGER PRIMARY KEY,
+                    actor_id INTEGER,
+                    message TEXT NOT NULL,
+                    is_broadcast INTEGER,
+                    target_user_id INTEGER,
+                    created_at TIMESTAMP,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            cursor.execute('''
+                SELECT id FROM notifications WHERE created_at < :cutoff
+                UNION
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY is_broadcast, target_user_id
+                        ORDER BY created_at DESC, id DESC
+                    ) AS position
+                    FROM notifications
+                )
+                WHERE position > :keep
+            ''', {'cutoff': cutoff, 'keep': keep_per_user})
+            expired = [row[0] for row in cursor.fetchall()]
+
+            # Short transactions so the app is never locked out for long
+            for start in range(0, len(expired), batch_size):
+                batch = json.dumps(expired[start:start + batch_size])
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('''
+                    INSERT OR IGNORE INTO archive.notifications
+                        (id, actor_id, message, is_broadcast, target_user_id, created_at)
+                    SELECT id, actor_id, message, is_broadcast, target_user_id, created_at
+                    FROM main.notifications
+                    WHERE id IN (SELECT value FROM json_each(?))
+                ''', (batch,))
+                cursor.execute('''
+                    DELETE FROM main.notifications WHERE id IN (SELECT value FROM json_each(?))
+                ''', (batch,))
+                conn.commit()
+
+            cursor.execute('DETACH DATABASE archive')
+            conn.close()
+            return True, len(expired)
+
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+
+    @instrumented
+    def reclaim_space(self, max_pages=None):
+        """Return free pages to the filesystem with incremental vacuum; returns pages freed.
+
+        Needs auto_vacuum=INCREMENTAL (see enable_incremental_vacuum); otherwise nothing is freed.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] != 2:
+                conn.close()
+                return True, 0
+
+            cursor.execute('PRAGMA freelist_count')
+            before = cursor.fetchone()[0]
+            # execute() steps the pragma once, freeing a single page; a script runs it to completion
+            if max_pages is None:
+                cursor.executescript('PRAGMA incremental_vacuum')
+            else:
+                cursor.executescript(f'PRAGMA incremental_vacuum({int(max_pages)})')
+            cursor.execute('PRAGMA freelist_count')
+            after = cursor.fetchone()[0]
+
+            conn.close()
+            return True, before - after
+
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+
+    @instrumented
+    def enable_incremental_vacuum(self):
+        """Switch an older database to auto_vacuum=INCREMENTAL; returns True if it was converted.
+
+        The switch needs a full VACUUM, so this is left to scheduled maintenance instead of startup.
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == 2:
+                conn.close()
+                return True, False
+
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+            conn.close()
+            return True, True
+
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+
+    @instrumented
+    def optimize_database(self, analyze=False):
+        """Refresh planner statistics: a full ANALYZE, or the cheap PRAGMA optimize"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if analyze or cursor.fetchone() is None:
+                # optimize only re-analyzes tables that already have statistics
+                cursor.execute('ANALYZE')
+            else:
+                cursor.execute('PRAGMA optimize')
+            conn.commit()
+            conn.close()
+            return True, "Statistics updated"
+
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+
+    @instrumented
+    def check_integrity(self, max_errors=100):
+        """Run PRAGMA quick_check; returns the problems found, empty when the database is sound"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute(f'PRAGMA quick_check({int(max_errors)})')
+            problems = [row[0] for row in cursor.fetchall() if row[0] != 'ok']
+            conn.close()
+            return True, problems
+
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+
+    @instrumented
+    def get_database_stats(self):
+        """Return page counts, free pages and the auto_vacuum mode of the database file"""
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            stats = {}
+            for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum'):
+                cursor.execute(f'PRAGMA {pragma}')
+                stats[pragma] = cursor.fetchone()[0]
+            conn.close()
+
+            stats['file_bytes'] = stats['page_size'] * stats['page_count']
+            stats['free_bytes'] = stats['page_size'] * stats['freelist_count']
+            stats['fragmentation'] = stats['freelist_count'] / stats['page_count'] if stats['page_count'] else 0.0
+            return True, stats
+
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
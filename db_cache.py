@@ -0,0 +1,125 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Rough in-memory size of a cached value in bytes"""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ByteLRUCache:
+    """LRU cache bounded by the total estimated size of its values"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, marking it most recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Cache value under key, evicting least recently used entries as needed"""
+        size = estimate_size(value)
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                # Never let a single huge value flush the whole cache
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _key, (_value, old_size) = self._entries.popitem(last=False)
+                self.current_bytes -= old_size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop key from the cache if present"""
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current usage"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+
+class VersionedCache:
+    """Read cache whose entries are valid only for the data version they were loaded at.
+
+    Entries live in a ByteLRUCache, so the cache stays within max_bytes however many
+    keys (e.g. one per book opened) it has seen.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.hits = 0
+        self.misses = 0
+        self._entries = ByteLRUCache(max_bytes)  # key -> (version, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Return the value cached for key at version, or None"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            with self._lock:
+                self.hits += 1
+            return entry[1]
+        with self._lock:
+            self.misses += 1
+        if entry is not None:
+            # An older version is never served again; free its space now
+            self._entries.invalidate(key)
+        return None
+
+    def put(self, key, version, value):
+        """Cache value for key as loaded at version"""
+        self._entries.put(key, (version, value))
+
+    def clear(self):
+        """Drop every entry"""
+        self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current usage"""
+        stats = self._entries.stats()
+        with self._lock:
+            stats.update(hits=self.hits, misses=self.misses)
+        return stats
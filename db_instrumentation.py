@@ -0,0 +1,205 @@
+import bisect
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class LatencyHistogram:
+    """Rolling latency histogram over the most recent samples"""
+
+    # Bucket upper bounds in milliseconds (last bucket is open ended)
+    BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.total_count = 0
+
+    def record(self, elapsed_ms):
+        """Add a latency sample in milliseconds"""
+        self.samples.append(elapsed_ms)
+        self.total_count += 1
+
+    def percentile(self, pct):
+        """Return the given percentile (0-100) of the current window"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def buckets(self):
+        """Return sample counts per latency bucket for the current window"""
+        counts = [0] * (len(self.BUCKETS_MS) + 1)
+        for sample in self.samples:
+            counts[bisect.bisect_left(self.BUCKETS_MS, sample)] += 1
+        labels = [f"<={bound}ms" for bound in self.BUCKETS_MS]
+        labels.append(f">{self.BUCKETS_MS[-1]}ms")
+        return dict(zip(labels, counts))
+
+    def summary(self):
+        """Return count, mean and tail latencies for the current window"""
+        window = len(self.samples)
+        return {
+            'count': self.total_count,
+            'window': window,
+            'mean_ms': sum(self.samples) / window if window else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': max(self.samples) if window else 0.0,
+        }
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement latency and rows returned"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.instrumentation.record_statement(
+                sql, (time.perf_counter() - start) * 1000)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.instrumentation.record_statement(
+                sql, (time.perf_counter() - start) * 1000)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.connection.instrumentation.record_rows(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.connection.instrumentation.record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.connection.instrumentation.record_rows(len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors are instrumented"""
+
+    instrumentation = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+
+class QueryInstrumentation:
+    """Collects per-method and per-SQL latency for AuthDatabase"""
+
+    def __init__(self, slow_query_ms=100.0, slow_query_log=None, window=1000):
+        self.slow_query_ms = slow_query_ms
+        self.window = window
+        self.method_latency = {}
+        self.sql_latency = {}
+        self.connect_latency = LatencyHistogram(window)
+        self.rows_returned = {}
+        self.statement_counts = {}
+        self.caches = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.slow_logger = logging.getLogger("appbook.slow_queries")
+        if slow_query_log:
+            handler = logging.FileHandler(slow_query_log)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.slow_logger.addHandler(handler)
+            self.slow_logger.setLevel(logging.INFO)
+            self.slow_logger.propagate = False
+
+    # Hooks used by AuthDatabase
+
+    def connect(self, db_path, **kwargs):
+        """Open an instrumented connection, recording the connection wait time"""
+        start = time.perf_counter()
+        conn = sqlite3.connect(db_path, factory=InstrumentedConnection, **kwargs)
+        conn.instrumentation = self
+        conn.set_trace_callback(self._trace)
+        with self._lock:
+            self.connect_latency.record((time.perf_counter() - start) * 1000)
+        return conn
+
+    def call_method(self, name, func, *args, **kwargs):
+        """Run an AuthDatabase method and record its latency"""
+        outer = getattr(self._local, 'method', None)
+        self._local.method = outer or name
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._local.method = outer
+            with self._lock:
+                self._histogram(self.method_latency, name).record(elapsed_ms)
+            if elapsed_ms >= self.slow_query_ms:
+                self.slow_logger.warning("SLOW METHOD %s took %.1f ms", name, elapsed_ms)
+
+    def record_statement(self, sql, elapsed_ms):
+        """Record the latency of a single SQL statement"""
+        key = " ".join(sql.split())
+        with self._lock:
+            self._histogram(self.sql_latency, key).record(elapsed_ms)
+        if elapsed_ms >= self.slow_query_ms:
+            method = getattr(self._local, 'method', None) or '-'
+            self.slow_logger.warning("SLOW SQL in %s took %.1f ms: %s", method, elapsed_ms, key)
+
+    def record_rows(self, count):
+        """Record rows returned to the current method"""
+        method = getattr(self._local, 'method', None) or '-'
+        with self._lock:
+            self.rows_returned[method] = self.rows_returned.get(method, 0) + count
+
+    def register_cache(self, name, cache):
+        """Expose a cache's hit/miss/eviction counters through snapshot()"""
+        self.caches[name] = cache
+
+    def snapshot(self):
+        """Return a summary of everything recorded so far"""
+        with self._lock:
+            return {
+                'methods': {name: h.summary() for name, h in self.method_latency.items()},
+                'sql': {sql: h.summary() for sql, h in self.sql_latency.items()},
+                'connect': self.connect_latency.summary(),
+                'rows_returned': dict(self.rows_returned),
+                'statements': dict(self.statement_counts),
+                'caches': {name: cache.stats() for name, cache in self.caches.items()},
+            }
+
+    def _trace(self, statement):
+        """sqlite3 trace callback: count every statement run per method"""
+        method = getattr(self._local, 'method', None) or '-'
+        with self._lock:
+            self.statement_counts[method] = self.statement_counts.get(method, 0) + 1
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = LatencyHistogram(self.window)
+        return histogram
+
+
+def instrumented(method):
+    """Decorator timing an AuthDatabase method when instrumentation is enabled"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.instrumentation is None:
+            return method(self, *args, **kwargs)
+        return self.instrumentation.call_method(name, method, self, *args, **kwargs)
+
+    return wrapper
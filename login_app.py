@@ -1,24 +1,57 @@
+import os
 import sys
+from datetime import datetime, timedelta, timezone
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QLineEdit, QPushButton, QStackedWidget, QMessageBox, QFrame,
     QScrollArea, QTextEdit, QComboBox, QListWidget, QListWidgetItem
 )
-from PySide6.QtWidgets import QDialog, QFormLayout
-from PySide6.QtCore import Qt, QSize
+from PySide6.QtWidgets import QDialog, QFormLayout, QAbstractItemView, QTableView, QHeaderView
+from PySide6.QtCore import Qt, QSize, QTimer, QEvent
 from PySide6.QtGui import QFont, QIcon
 from auth_db import AuthDatabase
+from db_instrumentation import QueryInstrumentation
+from money import Money
+from reader_view import ReaderView
+from ui_profiler import InteractionProfiler
+from user_table_model import UserTableModel
 
 
 class LoginSignupApp(QMainWindow):
+    # Search results shown per page
+    SEARCH_PAGE_SIZE = 50
+    # How often a logged-in session checks whether its user was banned
+    BAN_CHECK_MS = 5000
+    # Longest time a reading position stays in memory before it is written
+    PROGRESS_FLUSH_MS = 5000
+    # Pages the idle-time maintenance frees per run, so it never blocks the UI for long
+    IDLE_VACUUM_PAGES = 256
+    # User input that counts as activity for idle-time maintenance
+    ACTIVITY_EVENTS = (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.Wheel)
+    
     def __init__(self):
         super().__init__()
-        self.db = AuthDatabase()
+        self.db = AuthDatabase(instrumentation=self.create_db_instrumentation())
         self.current_user = None
         self.user_role = None  # 'admin' or 'user'
         
+        # Optional slot profiler; must wrap handlers before the UI connects them
+        self.profiler = InteractionProfiler.from_env()
+        if self.profiler:
+            self.profiler.instrument(self)
+        
         self.init_ui()
     
+    @staticmethod
+    def create_db_instrumentation():
+        """Enable query tracing when APPBOOK_TRACE_DB is set"""
+        if not os.environ.get("APPBOOK_TRACE_DB"):
+            return None
+        return QueryInstrumentation(
+            slow_query_ms=float(os.environ.get("APPBOOK_SLOW_QUERY_MS", "100")),
+            slow_query_log=os.environ.get("APPBOOK_SLOW_QUERY_LOG", "slow_queries.log"),
+        )
+    
     def init_ui(self):
         """Initialize the main UI"""
         self.setWindowTitle("Login & Sign Up")
@@ -59,6 +92,34 @@ class LoginSignupApp(QMainWindow):
         
         # Apply stylesheet
         self.apply_stylesheet()
+        
+        # Keep precomputed prices in step with scheduled discount windows
+        self.price_refresh_timer = QTimer(self)
+        self.price_refresh_timer.setSingleShot(True)
+        self.price_refresh_timer.timeout.connect(self.handle_price_refresh_timer)
+        self.schedule_price_refresh()
+        
+        # Sign out users banned while logged in (the banned set is in memory, so this is cheap)
+        self.ban_check_timer = QTimer(self)
+        self.ban_check_timer.timeout.connect(self.handle_ban_check_timer)
+        self.ban_check_timer.start(self.BAN_CHECK_MS)
+        
+        # Optional maintenance once the app has been idle for APPBOOK_IDLE_MAINTENANCE_MIN minutes
+        idle_minutes = float(os.environ.get("APPBOOK_IDLE_MAINTENANCE_MIN", "0"))
+        self.idle_maintenance_timer = None
+        if idle_minutes > 0:
+            self.idle_maintenance_timer = QTimer(self)
+            self.idle_maintenance_timer.setSingleShot(True)
+            self.idle_maintenance_timer.setInterval(int(idle_minutes * 60 * 1000))
+            self.idle_maintenance_timer.timeout.connect(self.handle_idle_maintenance_timer)
+            self.idle_maintenance_timer.start()
+            QApplication.instance().installEventFilter(self)
+    
+    def eventFilter(self, watched, event):
+        """Restart the idle countdown on any user input"""
+        if self.idle_maintenance_timer and event.type() in self.ACTIVITY_EVENTS:
+            self.idle_maintenance_timer.start()
+        return super().eventFilter(watched, event)
     
     def create_login_page(self):
         """Create login page"""
@@ -260,6 +321,14 @@ class LoginSignupApp(QMainWindow):
         self.user_category_list.itemClicked.connect(self.on_user_category_selected)
         left_layout.addWidget(self.user_category_list)
         
+        author_label = QLabel("Authors")
+        author_label.setFont(QFont("Arial", 12, QFont.Bold))
+        left_layout.addWidget(author_label)
+        
+        self.user_author_list = QListWidget()
+        self.user_author_list.itemClicked.connect(self.on_user_author_selected)
+        left_layout.addWidget(self.user_author_list)
+        
         left_frame.setLayout(left_layout)
         main_layout.addWidget(left_frame)
         
@@ -282,8 +351,16 @@ class LoginSignupApp(QMainWindow):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search by title, author, or category...")
         self.search_input.setMinimumHeight(35)
+        self.search_input.textEdited.connect(self.on_search_text_edited)
+        self.search_input.returnPressed.connect(self.handle_search_books)
         search_layout.addWidget(self.search_input)
         
+        # Suggestions are looked up once typing pauses, not on every keystroke
+        self.suggest_timer = QTimer(self)
+        self.suggest_timer.setSingleShot(True)
+        self.suggest_timer.setInterval(150)
+        self.suggest_timer.timeout.connect(self.handle_suggest_timer)
+        
         search_btn = QPushButton("Search")
         search_btn.setMinimumHeight(35)
         search_btn.setMaximumWidth(80)
@@ -298,11 +375,75 @@ class LoginSignupApp(QMainWindow):
         
         right_layout.addLayout(search_layout)
         
+        self.search_suggestions = QListWidget()
+        self.search_suggestions.setMaximumHeight(150)
+        self.search_suggestions.setVisible(False)
+        self.search_suggestions.itemClicked.connect(self.on_suggestion_selected)
+        right_layout.addWidget(self.search_suggestions)
+        
+        # Facet filters for search results, each entry showing its result count
+        facet_layout = QHBoxLayout()
+        self.facet_combos = {}
+        for facet in ('category', 'price', 'rating'):
+            combo = QComboBox()
+            combo.setMinimumHeight(30)
+            combo.activated.connect(self.handle_facet_changed)
+            facet_layout.addWidget(combo)
+            self.facet_combos[facet] = combo
+        self.facet_frame = QFrame()
+        self.facet_frame.setLayout(facet_layout)
+        self.facet_frame.setVisible(False)
+        right_layout.addWidget(self.facet_frame)
+        
+        # Sort order and price range for browsing the catalogue
+        sort_layout = QHBoxLayout()
+        self.browse_sort_combo = QComboBox()
+        self.browse_sort_combo.setMinimumHeight(30)
+        self.browse_sort_combo.addItem("Category & title", None)
+        self.browse_sort_combo.addItem("Cheapest first", 'cheapest')
+        self.browse_sort_combo.addItem("Newest first", 'newest')
+        self.browse_sort_combo.addItem("Top rated", 'top_rated')
+        sort_layout.addWidget(self.browse_sort_combo)
+        self.min_price_input = QLineEdit()
+        self.min_price_input.setPlaceholderText("Min $")
+        self.min_price_input.setMaximumWidth(80)
+        sort_layout.addWidget(self.min_price_input)
+        self.max_price_input = QLineEdit()
+        self.max_price_input.setPlaceholderText("Max $")
+        self.max_price_input.setMaximumWidth(80)
+        sort_layout.addWidget(self.max_price_input)
+        sort_btn = QPushButton("Apply")
+        sort_btn.setMaximumWidth(80)
+        sort_btn.clicked.connect(self.handle_browse_sorted)
+        sort_layout.addWidget(sort_btn)
+        right_layout.addLayout(sort_layout)
+        
         # Books display
         self.user_books_display = QListWidget()
         self.user_books_display.itemClicked.connect(self.on_user_book_selected)
         right_layout.addWidget(self.user_books_display)
         
+        # Paging through search results
+        paging_layout = QHBoxLayout()
+        self.prev_page_btn = QPushButton("Previous")
+        self.prev_page_btn.clicked.connect(self.handle_prev_page)
+        paging_layout.addWidget(self.prev_page_btn)
+        self.search_page_label = QLabel()
+        self.search_page_label.setAlignment(Qt.AlignCenter)
+        paging_layout.addWidget(self.search_page_label, 1)
+        self.next_page_btn = QPushButton("Next")
+        self.next_page_btn.clicked.connect(self.handle_next_page)
+        paging_layout.addWidget(self.next_page_btn)
+        self.paging_frame = QFrame()
+        self.paging_frame.setLayout(paging_layout)
+        self.paging_frame.setVisible(False)
+        right_layout.addWidget(self.paging_frame)
+        self.search_query = ""
+        self.search_page = 0
+        # Paging applies to a search or a sorted browse; browse pages are keyset cursors
+        self.listing_mode = 'search'
+        self.browse_cursors = [None]
+        
         # Buy button (initially hidden)
         self.buy_book_btn = QPushButton("Buy Selected Book")
         self.buy_book_btn.setMinimumHeight(35)
@@ -403,11 +544,17 @@ class LoginSignupApp(QMainWindow):
         separator.setFrameShape(QFrame.HLine)
         layout.addWidget(separator)
         
-        # Book content display
-        self.book_content_display = QTextEdit()
-        self.book_content_display.setReadOnly(True)
-        self.book_content_display.setFont(QFont("Arial", 11))
-        layout.addWidget(self.book_content_display)
+        # Book content display; only the chunks around the visible text are loaded
+        self.reader_view = ReaderView()
+        self.reader_view.positionChanged.connect(self.handle_reader_position_changed)
+        layout.addWidget(self.reader_view)
+        
+        # Scrolling only updates the position in memory; this writes it at most every few seconds
+        self.reader_book_id = None
+        self.progress_flush_timer = QTimer(self)
+        self.progress_flush_timer.setSingleShot(True)
+        self.progress_flush_timer.setInterval(self.PROGRESS_FLUSH_MS)
+        self.progress_flush_timer.timeout.connect(self.handle_progress_flush_timer)
         
         # Control buttons
         button_layout = QHBoxLayout()
@@ -451,7 +598,7 @@ class LoginSignupApp(QMainWindow):
         add_book_btn = QPushButton("Add New Book")
         add_book_btn.setMinimumHeight(40)
         add_book_btn.setFont(QFont("Arial", 11))
-        add_book_btn.clicked.connect(lambda: self.show_page(5))
+        add_book_btn.clicked.connect(self.show_add_book_page)
         layout.addWidget(add_book_btn)
         
         # View Books button
@@ -525,18 +672,6 @@ class LoginSignupApp(QMainWindow):
         
         self.book_category_input = QComboBox()
         self.book_category_input.setMinimumHeight(35)
-        self.book_category_input.addItems([
-            "Fiction",
-            "Non-Fiction",
-            "Science",
-            "History",
-            "Biography",
-            "Mystery",
-            "Romance",
-            "Technology",
-            "Self-Help",
-            "Other"
-        ])
         layout.addWidget(self.book_category_input)
         
         # Price
@@ -636,6 +771,11 @@ class LoginSignupApp(QMainWindow):
         delete_btn.clicked.connect(self.handle_delete_book)
         button_layout.addWidget(delete_btn)
         
+        reprice_btn = QPushButton("Bulk Reprice")
+        reprice_btn.setMinimumHeight(35)
+        reprice_btn.clicked.connect(self.show_reprice_dialog)
+        button_layout.addWidget(reprice_btn)
+        
         back_btn = QPushButton("Back to Dashboard")
         back_btn.setMinimumHeight(35)
         back_btn.clicked.connect(lambda: self.show_page(4))
@@ -671,19 +811,13 @@ class LoginSignupApp(QMainWindow):
         
         self.discount_category_combo = QComboBox()
         self.discount_category_combo.setMinimumHeight(35)
-        self.discount_category_combo.addItems([
-            "Fiction",
-            "Non-Fiction",
-            "Science",
-            "History",
-            "Biography",
-            "Mystery",
-            "Romance",
-            "Technology",
-            "Self-Help",
-            "Other"
-        ])
+        self.discount_category_combo.currentTextChanged.connect(self.refresh_discount_targets)
         category_layout.addWidget(self.discount_category_combo)
+        
+        # Whole category, or a single book overriding the category discount
+        self.discount_target_combo = QComboBox()
+        self.discount_target_combo.setMinimumHeight(35)
+        category_layout.addWidget(self.discount_target_combo)
         main_layout.addLayout(category_layout)
         
         # Discount percentage
@@ -700,6 +834,25 @@ class LoginSignupApp(QMainWindow):
         
         main_layout.addLayout(discount_input_layout)
         
+        # Optional time window (local time); leave empty for an always-on discount
+        window_label = QLabel("Schedule (optional, YYYY-MM-DD HH:MM):")
+        window_label.setFont(QFont("Arial", 11, QFont.Bold))
+        main_layout.addWidget(window_label)
+        
+        window_layout = QHBoxLayout()
+        
+        self.discount_start_input = QLineEdit()
+        self.discount_start_input.setPlaceholderText("Starts at (empty = now)")
+        self.discount_start_input.setMinimumHeight(35)
+        window_layout.addWidget(self.discount_start_input)
+        
+        self.discount_end_input = QLineEdit()
+        self.discount_end_input.setPlaceholderText("Ends at (empty = no end)")
+        self.discount_end_input.setMinimumHeight(35)
+        window_layout.addWidget(self.discount_end_input)
+        
+        main_layout.addLayout(window_layout)
+        
         # Apply button
         apply_btn = QPushButton("Apply Discount")
         apply_btn.setMinimumHeight(40)
@@ -724,6 +877,21 @@ class LoginSignupApp(QMainWindow):
         remove_btn.clicked.connect(self.handle_remove_discount)
         main_layout.addWidget(remove_btn)
         
+        # Scheduled discounts section
+        scheduled_label = QLabel("Scheduled and Book Discounts")
+        scheduled_label.setFont(QFont("Arial", 12, QFont.Bold))
+        main_layout.addWidget(scheduled_label)
+        
+        self.scheduled_discounts_list = QListWidget()
+        self.scheduled_discounts_list.setMinimumHeight(120)
+        main_layout.addWidget(self.scheduled_discounts_list)
+        
+        remove_scheduled_btn = QPushButton("Remove Selected Scheduled Discount")
+        remove_scheduled_btn.setMinimumHeight(40)
+        remove_scheduled_btn.setFont(QFont("Arial", 11))
+        remove_scheduled_btn.clicked.connect(self.handle_remove_scheduled_discount)
+        main_layout.addWidget(remove_scheduled_btn)
+        
         # Refresh button
         refresh_btn = QPushButton("Refresh")
         refresh_btn.setMinimumHeight(40)
@@ -753,27 +921,68 @@ class LoginSignupApp(QMainWindow):
         main_layout.addWidget(title)
         
         # Description
-        desc_label = QLabel("Select users to ban or unban them:")
+        desc_label = QLabel("Select users to ban or unban them (Ctrl/Shift-click for several):")
         desc_label.setFont(QFont("Arial", 11))
         main_layout.addWidget(desc_label)
         
-        # Users list
-        self.users_list = QListWidget()
-        self.users_list.setMinimumHeight(300)
-        main_layout.addWidget(self.users_list)
+        # Search and filters
+        filter_layout = QHBoxLayout()
+        
+        self.user_search_input = QLineEdit()
+        self.user_search_input.setPlaceholderText("Username or email starts with...")
+        self.user_search_input.setMinimumHeight(35)
+        self.user_search_input.returnPressed.connect(self.refresh_users_view)
+        filter_layout.addWidget(self.user_search_input, 1)
+        
+        self.user_search_field_combo = QComboBox()
+        self.user_search_field_combo.addItem("Username", 'username')
+        self.user_search_field_combo.addItem("Email", 'email')
+        filter_layout.addWidget(self.user_search_field_combo)
+        
+        self.user_status_combo = QComboBox()
+        self.user_status_combo.addItem("All users", None)
+        self.user_status_combo.addItem("Active", False)
+        self.user_status_combo.addItem("Banned", True)
+        filter_layout.addWidget(self.user_status_combo)
+        
+        self.user_created_from_input = QLineEdit()
+        self.user_created_from_input.setPlaceholderText("Joined from YYYY-MM-DD")
+        filter_layout.addWidget(self.user_created_from_input)
+        
+        self.user_created_to_input = QLineEdit()
+        self.user_created_to_input.setPlaceholderText("Joined to YYYY-MM-DD")
+        filter_layout.addWidget(self.user_created_to_input)
+        
+        user_search_btn = QPushButton("Search")
+        user_search_btn.setMinimumHeight(35)
+        user_search_btn.clicked.connect(self.refresh_users_view)
+        filter_layout.addWidget(user_search_btn)
+        
+        main_layout.addLayout(filter_layout)
+        
+        # Users table, loading further pages as it is scrolled
+        self.users_model = UserTableModel(self.db, parent=self)
+        self.users_table = QTableView()
+        self.users_table.setModel(self.users_model)
+        self.users_table.setMinimumHeight(300)
+        self.users_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.users_table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.users_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.users_table.verticalHeader().setVisible(False)
+        main_layout.addWidget(self.users_table)
         
         # Button layout
         button_layout = QHBoxLayout()
         
         # Ban button
-        ban_btn = QPushButton("Ban Selected User")
+        ban_btn = QPushButton("Ban Selected Users")
         ban_btn.setMinimumHeight(40)
         ban_btn.setFont(QFont("Arial", 11))
         ban_btn.clicked.connect(self.handle_ban_user)
         button_layout.addWidget(ban_btn)
         
         # Unban button
-        unban_btn = QPushButton("Unban Selected User")
+        unban_btn = QPushButton("Unban Selected Users")
         unban_btn.setMinimumHeight(40)
         unban_btn.setFont(QFont("Arial", 11))
         unban_btn.clicked.connect(self.handle_unban_user)
@@ -799,87 +1008,84 @@ class LoginSignupApp(QMainWindow):
         return page
     
     def refresh_users_view(self):
-        """Refresh the users list"""
-        success, users = self.db.get_all_users()
+        """Reload the users table from its first page with the current search and filters"""
+        try:
+            created_from = self.parse_local_date(self.user_created_from_input.text())
+            created_to = self.parse_local_date(self.user_created_to_input.text(), next_day=True)
+        except ValueError:
+            QMessageBox.warning(self, "Input Error", "Dates must be in the format YYYY-MM-DD")
+            return
         
-        if success:
-            self.users_list.clear()
-            for user_id, username, email, is_banned, created_at in users:
-                status = "(BANNED)" if is_banned else "(Active)"
-                user_text = f"{username}\nEmail: {email}\nStatus: {status}"
-                
-                item = QListWidgetItem(user_text)
-                item.setData(Qt.UserRole, user_id)
-                
-                # Color code banned users
-                if is_banned:
-                    item.setForeground(Qt.red)
-                else:
-                    item.setForeground(Qt.green)
-                
-                self.users_list.addItem(item)
-        else:
+        if not self.users_model.set_filters(
+                prefix=self.user_search_input.text(),
+                field=self.user_search_field_combo.currentData(),
+                banned=self.user_status_combo.currentData(),
+                created_from=created_from,
+                created_to=created_to):
             QMessageBox.critical(self, "Error", "Failed to load users")
     
+    @staticmethod
+    def parse_local_date(text, next_day=False):
+        """Convert a local 'YYYY-MM-DD' to the UTC timestamp of its start (or the next day's), or None"""
+        text = text.strip()
+        if not text:
+            return None
+        local = datetime.strptime(text, "%Y-%m-%d")
+        if next_day:
+            local += timedelta(days=1)
+        return local.astimezone().astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    
     def handle_ban_user(self):
-        """Handle banning a user"""
-        selected = self.users_list.currentItem()
+        """Handle banning the selected users"""
+        self.set_selected_users_banned(True)
+    
+    def handle_unban_user(self):
+        """Handle unbanning the selected users"""
+        self.set_selected_users_banned(False)
+    
+    def set_selected_users_banned(self, banned):
+        """Ban or unban every selected user and notify them, as one database operation"""
+        selected = [self.users_model.user(index.row())
+                    for index in self.users_table.selectionModel().selectedRows()]
+        action = "ban" if banned else "unban"
         
         if not selected:
-            QMessageBox.warning(self, "Selection Error", "Please select a user to ban")
+            QMessageBox.warning(self, "Selection Error", f"Please select users to {action}")
             return
         
-        user_id = selected.data(Qt.UserRole)
-        username = selected.text().split('\n')[0]
-        
-        # Confirm ban
-        reply = QMessageBox.question(self, "Confirm Ban", 
-                                     f"Are you sure you want to ban user '{username}'?\nThey will not be able to login.")
-        if reply == QMessageBox.Yes:
-            success, message = self.db.ban_user(user_id)
-            
-            if success:
-                QMessageBox.information(self, "Success", message)
-                self.refresh_users_view()
-                # Notify the specific user (targeted)
-                actor_id = self.current_user[0] if self.current_user else None
-                actor_name = self.current_user[1] if self.current_user else 'Admin'
-                note_msg = f"{actor_name} has banned your account. Contact admin for details."
-                self.db.add_notification(actor_id, note_msg, broadcast=False, target_user_id=user_id)
-            else:
-                QMessageBox.critical(self, "Error", message)
-    
-    def handle_unban_user(self):
-        """Handle unbanning a user"""
-        selected = self.users_list.currentItem()
+        user_ids = [user[0] for user in selected]
+        if len(selected) == 1:
+            target = f"user '{selected[0][1]}'"
+        else:
+            target = f"{len(selected)} users"
+        consequence = "They will not be able to login." if banned else "They will be able to login again."
         
-        if not selected:
-            QMessageBox.warning(self, "Selection Error", "Please select a user to unban")
+        # Confirm
+        reply = QMessageBox.question(self, f"Confirm {action.capitalize()}",
+                                     f"Are you sure you want to {action} {target}?\n{consequence}")
+        if reply != QMessageBox.Yes:
             return
         
-        user_id = selected.data(Qt.UserRole)
-        username = selected.text().split('\n')[0]
+        # Notify each affected user (targeted) in the same transaction
+        actor_id = self.current_user[0] if self.current_user else None
+        actor_name = self.current_user[1] if self.current_user else 'Admin'
+        if banned:
+            note_msg = f"{actor_name} has banned your account. Contact admin for details."
+            success, result = self.db.ban_users(user_ids, actor_id, note_msg)
+        else:
+            note_msg = f"{actor_name} has unbanned your account. You can login now."
+            success, result = self.db.unban_users(user_ids, actor_id, note_msg)
         
-        # Confirm unban
-        reply = QMessageBox.question(self, "Confirm Unban", 
-                                     f"Are you sure you want to unban user '{username}'?\nThey will be able to login again.")
-        if reply == QMessageBox.Yes:
-            success, message = self.db.unban_user(user_id)
-            
-            if success:
-                QMessageBox.information(self, "Success", message)
-                self.refresh_users_view()
-                # Notify the specific user (targeted)
-                actor_id = self.current_user[0] if self.current_user else None
-                actor_name = self.current_user[1] if self.current_user else 'Admin'
-                note_msg = f"{actor_name} has unbanned your account. You can login now."
-                self.db.add_notification(actor_id, note_msg, broadcast=False, target_user_id=user_id)
-            else:
-                QMessageBox.critical(self, "Error", message)
+        if success:
+            QMessageBox.information(self, "Success", f"{len(result)} user(s) {action}ned successfully")
+            self.refresh_users_view()
+        else:
+            QMessageBox.critical(self, "Error", result)
     
     def handle_apply_discount(self):
-        """Handle applying discount to a category"""
+        """Handle applying discount to a category or book, optionally within a time window"""
         category = self.discount_category_combo.currentText()
+        book_id = self.discount_target_combo.currentData()
         discount_text = self.discount_percentage_input.text().strip()
         
         # Validation
@@ -896,13 +1102,31 @@ class LoginSignupApp(QMainWindow):
             QMessageBox.warning(self, "Discount Error", "Please enter a valid number")
             return
         
+        try:
+            starts_at = self.parse_local_time(self.discount_start_input.text())
+            ends_at = self.parse_local_time(self.discount_end_input.text())
+        except ValueError:
+            QMessageBox.warning(self, "Schedule Error", "Please enter times as YYYY-MM-DD HH:MM")
+            return
+        
         # Apply discount
-        success, message = self.db.set_category_discount(category, discount)
+        if book_id is None and starts_at is None and ends_at is None:
+            success, message = self.db.set_category_discount(category, discount)
+            target = f"category {category}"
+        elif book_id is None:
+            success, message = self.db.schedule_discount(discount, starts_at, ends_at, category=category)
+            target = f"category {category}"
+        else:
+            success, message = self.db.schedule_discount(discount, starts_at, ends_at, book_id=book_id)
+            target = f"'{self.discount_target_combo.currentText()}'"
         
         if success:
             QMessageBox.information(self, "Success", message)
             self.discount_percentage_input.clear()
+            self.discount_start_input.clear()
+            self.discount_end_input.clear()
             self.refresh_discounts_view()
+            self.schedule_price_refresh()
             # Notify users about discount change
             if self.current_user:
                 admin_id = self.current_user[0]
@@ -910,11 +1134,65 @@ class LoginSignupApp(QMainWindow):
             else:
                 admin_id = None
                 admin_name = 'Admin'
-            note_msg = f"{admin_name} set discount {discount}% for category {category}"
+            note_msg = f"{admin_name} set discount {discount}% for {target}"
+            if starts_at:
+                note_msg += f" from {starts_at} UTC"
+            if ends_at:
+                note_msg += f" until {ends_at} UTC"
             self.db.add_notification(admin_id, note_msg, broadcast=True)
         else:
             QMessageBox.critical(self, "Error", message)
     
+    @staticmethod
+    def parse_local_time(text):
+        """Convert 'YYYY-MM-DD HH:MM' local time to a UTC timestamp string, or None if empty"""
+        text = text.strip()
+        if not text:
+            return None
+        local = datetime.strptime(text, "%Y-%m-%d %H:%M").astimezone()
+        return local.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    
+    def refresh_discount_targets(self, category=None):
+        """List the books of the chosen category as per-book discount targets"""
+        category = category or self.discount_category_combo.currentText()
+        self.discount_target_combo.clear()
+        self.discount_target_combo.addItem("All books in category", None)
+        success, books_by_category = self.db.get_books_by_category()
+        if success:
+            for book in books_by_category.get(category, []):
+                self.discount_target_combo.addItem(book[1], book[0])
+    
+    def handle_remove_scheduled_discount(self):
+        """Handle removing a scheduled or per-book discount"""
+        selected = self.scheduled_discounts_list.currentItem()
+        
+        if not selected:
+            QMessageBox.warning(self, "Selection Error", "Please select a scheduled discount to remove")
+            return
+        
+        success, message = self.db.delete_scheduled_discount(selected.data(Qt.UserRole))
+        if success:
+            self.refresh_discounts_view()
+            self.schedule_price_refresh()
+        else:
+            QMessageBox.critical(self, "Error", message)
+    
+    def schedule_price_refresh(self):
+        """Arm a timer that refreshes effective prices when the next discount window opens or closes"""
+        self.price_refresh_timer.stop()
+        next_change = self.db.get_next_price_change()
+        if next_change is None:
+            return
+        when = datetime.strptime(next_change, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        delay_ms = int((when - datetime.now(timezone.utc)).total_seconds() * 1000) + 1000
+        # Re-check at least hourly so long waits never overflow the timer
+        self.price_refresh_timer.start(max(1000, min(delay_ms, 3600 * 1000)))
+    
+    def handle_price_refresh_timer(self):
+        """Refresh effective prices when a discount window boundary is reached"""
+        self.db.refresh_effective_prices()
+        self.schedule_price_refresh()
+    
     def refresh_discounts_view(self):
         """Refresh the discounts list"""
         success, discounts = self.db.get_category_discounts()
@@ -928,6 +1206,17 @@ class LoginSignupApp(QMainWindow):
                 self.discounts_list.addItem(item)
         else:
             QMessageBox.critical(self, "Error", "Failed to load discounts")
+        
+        success, scheduled = self.db.get_scheduled_discounts()
+        self.scheduled_discounts_list.clear()
+        if success:
+            for discount_id, category, book_id, title, discount_pct, starts_at, ends_at in scheduled:
+                target = category if category else f"'{title}'"
+                window = f"from {starts_at or 'now'} until {ends_at or 'no end'} (UTC)"
+                item = QListWidgetItem(f"{target}: {discount_pct}% OFF {window}")
+                item.setData(Qt.UserRole, discount_id)
+                self.scheduled_discounts_list.addItem(item)
+        self.refresh_discount_targets()
     
     def handle_remove_discount(self):
         """Handle removing a discount"""
@@ -975,8 +1264,8 @@ class LoginSignupApp(QMainWindow):
         
         # Validate price
         try:
-            price = float(price_text) if price_text else 0.0
-            if price < 0:
+            price = Money.parse(price_text) if price_text else Money(0)
+            if price.cents < 0:
                 QMessageBox.warning(self, "Price Error", "Price cannot be negative")
                 return
         except ValueError:
@@ -984,7 +1273,7 @@ class LoginSignupApp(QMainWindow):
             return
         
         # Add book to database
-        success, message = self.db.add_book(title, author, category, price, description, content)
+        success, message = self.db.add_book(title, author, category, price.cents, description, content)
         
         if success:
             QMessageBox.information(self, "Success", message)
@@ -1034,26 +1323,28 @@ class LoginSignupApp(QMainWindow):
         self.books_display.clear()
         
         if hasattr(self, 'books_data') and category in self.books_data:
-            # Get discount for this category
-            success, discount = self.db.get_category_discount(category)
-            
             for book in self.books_data[category]:
-                book_id, title, author, price, description = book
-                
-                # Calculate discounted price if discount exists
-                if success and discount > 0:
-                    discounted_price = price * (1 - discount / 100)
-                    book_text = f"{title}\nby {author}\nOriginal Price: ${price:.2f}\nDiscount: {discount}%\nFinal Price: ${discounted_price:.2f}"
-                else:
-                    book_text = f"{title}\nby {author}\nPrice: ${price:.2f}"
-                
-                if description:
-                    book_text += f"\n{description}"
+                book_id, title, author, price, description, discount, final_price = book
+                book_text = self.format_book_text(title, author, price, discount, final_price, description)
                 
                 list_item = QListWidgetItem(book_text)
                 list_item.setData(Qt.UserRole, book_id)
                 self.books_display.addItem(list_item)
     
+    @staticmethod
+    def format_book_text(title, author, price, discount, final_price, description, category=None):
+        """Build the list text for a book from its precomputed final price"""
+        book_text = f"{title}\nby {author}"
+        if category:
+            book_text += f"\nCategory: {category}"
+        if discount > 0:
+            book_text += f"\nOriginal Price: {Money(price)}\nDiscount: {discount}%\nFinal Price: {Money(final_price)}"
+        else:
+            book_text += f"\nPrice: {Money(price)}"
+        if description:
+            book_text += f"\n{description}"
+        return book_text
+    
     def handle_delete_book(self):
         """Handle deleting a selected book"""
         selected = self.books_display.currentItem()
@@ -1087,6 +1378,100 @@ class LoginSignupApp(QMainWindow):
             else:
                 QMessageBox.critical(self, "Error", message)
     
+    def show_reprice_dialog(self):
+        """Dialog for previewing and applying a bulk price change"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Bulk Reprice")
+        dialog.setMinimumSize(QSize(500, 400))
+        layout = QVBoxLayout()
+        form = QFormLayout()
+        
+        scope_combo = QComboBox()
+        scope_combo.addItem("All books", None)
+        success, books_by_category = self.db.get_books_by_category()
+        if success:
+            for category in sorted(books_by_category.keys()):
+                scope_combo.addItem(category, category)
+        form.addRow("Category:", scope_combo)
+        
+        author_input = QLineEdit()
+        author_input.setPlaceholderText("Optional exact author name")
+        form.addRow("Author:", author_input)
+        
+        mode_combo = QComboBox()
+        mode_combo.addItem("Percentage (%)", 'percent')
+        mode_combo.addItem("Amount ($)", 'absolute')
+        form.addRow("Change by:", mode_combo)
+        
+        value_input = QLineEdit()
+        value_input.setPlaceholderText("e.g. 10 or -2.50")
+        form.addRow("Value:", value_input)
+        layout.addLayout(form)
+        
+        preview_list = QListWidget()
+        layout.addWidget(preview_list, 1)
+        
+        def read_request():
+            try:
+                if mode_combo.currentData() == 'absolute':
+                    value = Money.parse(value_input.text()).cents
+                else:
+                    value = float(value_input.text().strip())
+            except ValueError:
+                QMessageBox.warning(dialog, "Input Error", "Please enter a valid number")
+                return None
+            author = author_input.text().strip() or None
+            return mode_combo.currentData(), value, scope_combo.currentData(), author
+        
+        def preview():
+            request = read_request()
+            if request is None:
+                return
+            ok, changes = self.db.preview_reprice(*request)
+            preview_list.clear()
+            if not ok:
+                QMessageBox.critical(dialog, "Error", changes)
+                return
+            preview_list.addItem(f"{len(changes)} book(s) will change")
+            # Showing every row of a huge batch would stall the dialog
+            for book_id, title, old_price, new_price in changes[:500]:
+                preview_list.addItem(f"{title}: {Money(old_price)} -> {Money(new_price)}")
+        
+        def apply():
+            request = read_request()
+            if request is None:
+                return
+            reply = QMessageBox.question(dialog, "Confirm Reprice", "Apply this price change?")
+            if reply != QMessageBox.Yes:
+                return
+            ok, msg = self.db.apply_reprice(*request)
+            if ok:
+                QMessageBox.information(dialog, "Success", msg)
+                dialog.accept()
+                self.refresh_books_view()
+            else:
+                QMessageBox.critical(dialog, "Error", msg)
+        
+        button_layout = QHBoxLayout()
+        preview_btn = QPushButton("Preview")
+        preview_btn.setMinimumHeight(35)
+        preview_btn.clicked.connect(preview)
+        button_layout.addWidget(preview_btn)
+        
+        apply_btn = QPushButton("Apply")
+        apply_btn.setMinimumHeight(35)
+        apply_btn.clicked.connect(apply)
+        button_layout.addWidget(apply_btn)
+        
+        close_btn = QPushButton("Close")
+        close_btn.setMinimumHeight(35)
+        close_btn.clicked.connect(dialog.reject)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+        
+        dialog.setLayout(layout)
+        dialog.exec()
+    
     def handle_login(self):
         """Handle login button click"""
         username = self.login_username.text().strip()
@@ -1097,18 +1482,14 @@ class LoginSignupApp(QMainWindow):
             QMessageBox.warning(self, "Input Error", "Please fill in all fields")
             return
         
-        # Check if user is banned
-        if self.db.is_user_banned(username):
-            QMessageBox.critical(self, "Login Failed", "Your account has been banned. Please contact administrator.")
-            return
-        
-        # Attempt login
+        # Attempt login (also rejects banned accounts)
         success, result = self.db.login_user(username, password)
         
         if success:
             user_id, username, email, role = result
             self.current_user = (user_id, username, email)
             self.user_role = role
+            self.db.load_entitlements(user_id)
             
             # Route to appropriate dashboard based on role
             if role == 'admin':
@@ -1172,7 +1553,12 @@ class LoginSignupApp(QMainWindow):
             
             if self.user_role == 'admin':
                 self.admin_welcome_label.setText(f"Welcome, Admin {username}!")
-                self.admin_info_label.setText(f"Email: {email}\nID: {user_id}\nRole: Administrator")
+                admin_info = f"Email: {email}\nID: {user_id}\nRole: Administrator"
+                ok, totals = self.db.get_sales_totals()
+                if ok:
+                    sales, gross, discounts, revenue = totals
+                    admin_info += f"\nSales: {sales} - Revenue: {Money(revenue)} (discounts {Money(discounts)})"
+                self.admin_info_label.setText(admin_info)
             else:
                 self.welcome_label.setText(f"Welcome, {username}!")
                 self.user_info_label.setText(f"Email: {email}\nID: {user_id}")
@@ -1185,14 +1571,45 @@ class LoginSignupApp(QMainWindow):
                     except Exception:
                         pass
     
+    def handle_idle_maintenance_timer(self):
+        """Run light maintenance while nobody is using the app; the full run is maintenance.py"""
+        self.db.optimize_database()
+        self.db.reclaim_space(max_pages=self.IDLE_VACUUM_PAGES)
+    
+    def handle_ban_check_timer(self):
+        """Periodically enforce bans on the current session"""
+        self.enforce_ban()
+    
+    def enforce_ban(self):
+        """Log out the current user if they have been banned; return True if so"""
+        if not self.current_user or self.user_role != 'user':
+            return False
+        if not self.db.is_user_id_banned(self.current_user[0]):
+            return False
+        
+        # Close any open dialogs (book info, reader) before leaving the session
+        for _ in range(10):
+            modal = QApplication.activeModalWidget()
+            if modal is None:
+                break
+            modal.close()
+        self.handle_logout()
+        QMessageBox.warning(self, "Account Banned", "Your account has been banned. You have been logged out.")
+        return True
+    
     def handle_logout(self):
         """Handle logout"""
+        self.close_reader()
+        if self.current_user:
+            self.db.release_entitlements(self.current_user[0])
         self.current_user = None
         self.user_role = None
         self.show_page(0)
     
     def show_page(self, index):
         """Switch to specified page"""
+        if index != 10 and self.stacked_widget.currentIndex() == 10:
+            self.close_reader()
         self.stacked_widget.setCurrentIndex(index)
     
     def show_users_management(self):
@@ -1217,6 +1634,15 @@ class LoginSignupApp(QMainWindow):
                 item.setData(Qt.UserRole, category)
                 self.user_category_list.addItem(item)
             
+            # Populate authors with their book counts
+            self.user_author_list.clear()
+            a_success, authors = self.db.get_authors()
+            if a_success:
+                for author_id, name, book_count in authors:
+                    item = QListWidgetItem(f"{name} ({book_count})")
+                    item.setData(Qt.UserRole, author_id)
+                    self.user_author_list.addItem(item)
+            
             # Clear books display
             self.user_books_display.clear()
             
@@ -1231,69 +1657,204 @@ class LoginSignupApp(QMainWindow):
         
         # Clear search when selecting category
         self.search_input.clear()
+        self.facet_frame.setVisible(False)
+        self.paging_frame.setVisible(False)
+        self.user_author_list.clearSelection()
         
         # Display books for selected category
+        if hasattr(self, 'user_books_data') and category in self.user_books_data:
+            self.display_user_books(self.user_books_data[category])
+        else:
+            self.user_books_display.clear()
+    
+    def on_user_author_selected(self, item):
+        """Handle author selection for user"""
+        success, books = self.db.get_books_by_author(item.data(Qt.UserRole))
+        if not success:
+            QMessageBox.critical(self, "Error", books)
+            return
+        
+        self.search_input.clear()
+        self.facet_frame.setVisible(False)
+        self.paging_frame.setVisible(False)
+        self.user_category_list.clearSelection()
+        self.display_user_books(books)
+    
+    def display_user_books(self, books):
+        """List (id, title, author, price, description, discount, final price) rows for the user"""
         self.user_books_display.clear()
+        owned = self.db.get_owned_book_ids(self.current_user[0])
         
-        if hasattr(self, 'user_books_data') and category in self.user_books_data:
-            # Get discount for this category
-            success, discount = self.db.get_category_discount(category)
+        for book in books:
+            book_id, title, author, price, description, discount, final_price = book
+            book_text = self.format_book_text(title, author, price, discount, final_price, description)
+            if book_id in owned:
+                book_text = "[Owned] " + book_text
             
-            for book in self.user_books_data[category]:
-                book_id, title, author, price, description = book
-                
-                # Calculate discounted price if discount exists
-                if success and discount > 0:
-                    discounted_price = price * (1 - discount / 100)
-                    book_text = f"{title}\nby {author}\nOriginal Price: ${price:.2f}\nDiscount: {discount}%\nFinal Price: ${discounted_price:.2f}"
-                else:
-                    book_text = f"{title}\nby {author}\nPrice: ${price:.2f}"
-                
-                if description:
-                    book_text += f"\n{description}"
-                
-                list_item = QListWidgetItem(book_text)
-                list_item.setData(Qt.UserRole, book_id)
-                self.user_books_display.addItem(list_item)
+            list_item = QListWidgetItem(book_text)
+            list_item.setData(Qt.UserRole, book_id)
+            self.user_books_display.addItem(list_item)
+    
+    def on_search_text_edited(self, text):
+        """Restart the suggestion debounce on each keystroke"""
+        self.suggest_timer.start()
+    
+    def handle_suggest_timer(self):
+        """Show type-ahead suggestions for the current search text"""
+        self.search_suggestions.clear()
+        success, suggestions = self.db.suggest_books(self.search_input.text(), limit=8)
+        if success:
+            for book_id, title, author in suggestions:
+                item = QListWidgetItem(f"{title} by {author}")
+                item.setData(Qt.UserRole, title)
+                self.search_suggestions.addItem(item)
+        self.search_suggestions.setVisible(self.search_suggestions.count() > 0)
+    
+    def on_suggestion_selected(self, item):
+        """Search for the suggested title"""
+        self.search_input.setText(item.data(Qt.UserRole))
+        self.handle_search_books()
     
     def handle_search_books(self):
         """Handle searching for books"""
+        self.suggest_timer.stop()
+        self.search_suggestions.setVisible(False)
         search_query = self.search_input.text().strip()
         
         if not search_query:
             QMessageBox.warning(self, "Search Error", "Please enter a search term")
             return
         
-        success, results = self.db.search_books(search_query)
-        
-        if not success:
-            QMessageBox.critical(self, "Error", results)
-            return
-        
-        # Clear and display search results
-        self.user_books_display.clear()
+        self.search_query = search_query
+        self.listing_mode = 'search'
+        for combo in self.facet_combos.values():
+            combo.clear()
         self.user_category_list.clearSelection()
+        self.user_author_list.clearSelection()
         
-        if not results:
+        if self.show_search_page(0) == 0:
             QMessageBox.information(self, "Search Results", "No books found matching your search")
-            return
+    
+    def handle_facet_changed(self, index=None):
+        """Narrow the current search to the chosen facet values"""
+        self.show_search_page(0)
+    
+    def show_search_page(self, page):
+        """Show one page of the current search with facet counts; return the number of matches"""
+        filters = {facet: combo.currentData() for facet, combo in self.facet_combos.items()}
+        success, result = self.db.faceted_search(
+            self.search_query, category=filters['category'], price_bucket=filters['price'],
+            rating_bucket=filters['rating'], page=page, page_size=self.SEARCH_PAGE_SIZE)
+        
+        if not success:
+            QMessageBox.critical(self, "Error", result)
+            return 0
+        
+        self.search_page = page
+        all_labels = {'category': "All categories", 'price': "Any price", 'rating': "Any rating"}
+        for facet, combo in self.facet_combos.items():
+            combo.clear()
+            combo.addItem(all_labels[facet], None)
+            for label, count in result['facets'][facet]:
+                combo.addItem(f"{label} ({count})", label)
+            combo.setCurrentIndex(max(0, combo.findData(filters[facet])))
+        
+        total = result['total']
+        first = page * self.SEARCH_PAGE_SIZE
+        self.search_page_label.setText(
+            f"{first + 1}-{first + len(result['books'])} of {total}" if total else "No matches")
+        self.prev_page_btn.setEnabled(page > 0)
+        self.next_page_btn.setEnabled(first + len(result['books']) < total)
+        self.facet_frame.setVisible(True)
+        self.paging_frame.setVisible(True)
         
         # Display search results
-        for book in results:
-            book_id, title, author, category, price, description = book
-            
-            # Get discount for this category
-            success, discount = self.db.get_category_discount(category)
+        self.user_books_display.clear()
+        owned = self.db.get_owned_book_ids(self.current_user[0])
+        for book in result['books']:
+            book_id, title, author, category, price, description, discount, final_price = book
+            book_text = self.format_book_text(title, author, price, discount, final_price, description, category)
+            if book_id in owned:
+                book_text = "[Owned] " + book_text
             
-            # Calculate discounted price if discount exists
-            if success and discount > 0:
-                discounted_price = price * (1 - discount / 100)
-                book_text = f"{title}\nby {author}\nCategory: {category}\nOriginal Price: ${price:.2f}\nDiscount: {discount}%\nFinal Price: ${discounted_price:.2f}"
+            list_item = QListWidgetItem(book_text)
+            list_item.setData(Qt.UserRole, book_id)
+            self.user_books_display.addItem(list_item)
+        return total
+    
+    def handle_prev_page(self):
+        """Show the previous page of the current search or sorted listing"""
+        if self.listing_mode == 'search':
+            self.show_search_page(self.search_page - 1)
+        elif len(self.browse_cursors) > 1:
+            self.browse_cursors.pop()
+            self.show_browse_page()
+    
+    def handle_next_page(self):
+        """Show the next page of the current search or sorted listing"""
+        if self.listing_mode == 'search':
+            self.show_search_page(self.search_page + 1)
+        elif self.browse_next is not None:
+            self.browse_cursors.append(self.browse_next)
+            self.show_browse_page()
+    
+    def handle_browse_sorted(self):
+        """List the selected category (or all books) in the chosen order and price range"""
+        sort = self.browse_sort_combo.currentData()
+        try:
+            self.browse_min_cents = self.parse_optional_price(self.min_price_input.text())
+            self.browse_max_cents = self.parse_optional_price(self.max_price_input.text())
+        except ValueError:
+            QMessageBox.warning(self, "Input Error", "Please enter valid prices")
+            return
+        
+        selected = self.user_category_list.currentItem()
+        self.browse_category = selected.data(Qt.UserRole) if selected and selected.isSelected() else None
+        if sort is None and self.browse_min_cents is None and self.browse_max_cents is None:
+            # Default order is the cached per-category listing
+            if self.browse_category is not None:
+                self.on_user_category_selected(selected)
             else:
-                book_text = f"{title}\nby {author}\nCategory: {category}\nPrice: ${price:.2f}"
-            
-            if description:
-                book_text += f"\n{description}"
+                self.clear_search()
+            return
+        
+        self.browse_sort = sort or 'cheapest'
+        self.listing_mode = 'browse'
+        self.browse_cursors = [None]
+        self.search_input.clear()
+        self.facet_frame.setVisible(False)
+        self.user_author_list.clearSelection()
+        self.show_browse_page()
+    
+    @staticmethod
+    def parse_optional_price(text):
+        """Parse a price field into cents, None when left empty"""
+        return Money.parse(text).cents if text.strip() else None
+    
+    def show_browse_page(self):
+        """Show the sorted listing page starting at the last cursor"""
+        success, result = self.db.browse_books(
+            self.browse_sort, category=self.browse_category, min_cents=self.browse_min_cents,
+            max_cents=self.browse_max_cents, after=self.browse_cursors[-1], limit=self.SEARCH_PAGE_SIZE)
+        if not success:
+            QMessageBox.critical(self, "Error", result)
+            return
+        
+        books, self.browse_next = result
+        first = (len(self.browse_cursors) - 1) * self.SEARCH_PAGE_SIZE
+        self.search_page_label.setText(
+            f"{first + 1}-{first + len(books)}" if books else "No matches")
+        self.prev_page_btn.setEnabled(len(self.browse_cursors) > 1)
+        self.next_page_btn.setEnabled(self.browse_next is not None)
+        self.paging_frame.setVisible(True)
+        
+        self.user_books_display.clear()
+        owned = self.db.get_owned_book_ids(self.current_user[0])
+        for book in books:
+            book_id, title, author, category, price, description, discount, final_price = book
+            book_text = self.format_book_text(title, author, price, discount, final_price, description, category)
+            if book_id in owned:
+                book_text = "[Owned] " + book_text
             
             list_item = QListWidgetItem(book_text)
             list_item.setData(Qt.UserRole, book_id)
@@ -1302,10 +1863,35 @@ class LoginSignupApp(QMainWindow):
     def clear_search(self):
         """Clear search and show all books again"""
         self.search_input.clear()
+        self.suggest_timer.stop()
+        self.search_suggestions.setVisible(False)
         self.user_category_list.clearSelection()
+        self.user_author_list.clearSelection()
         self.user_books_display.clear()
+        self.facet_frame.setVisible(False)
+        self.paging_frame.setVisible(False)
         self.refresh_user_books_view()
     
+    def show_add_book_page(self):
+        """Show the add book page with current categories"""
+        self.refresh_category_combos()
+        self.show_page(5)
+    
+    def refresh_category_combos(self):
+        """Fill the category selectors from the categories table, keeping the current choice"""
+        success, categories = self.db.get_categories()
+        if not success:
+            return
+        names = [name for _category_id, name in categories]
+        for combo in (self.book_category_input, self.discount_category_combo):
+            current = combo.currentText()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItems(names)
+            if current in names:
+                combo.setCurrentText(current)
+            combo.blockSignals(False)
+    
     def show_admin_books_view(self):
         """Show admin books view and load data"""
         self.refresh_books_view()
@@ -1313,13 +1899,15 @@ class LoginSignupApp(QMainWindow):
     
     def show_discount_management(self):
         """Show discount management page"""
+        self.refresh_category_combos()
         self.refresh_discounts_view()
         self.show_page(7)
     
     def on_user_book_selected(self, item):
         """Handle book selection in user books view"""
-        # Show buy button when a book is selected
-        self.buy_book_btn.setVisible(True)
+        # Show buy button when a book the user does not own yet is selected
+        book_id = item.data(Qt.UserRole)
+        self.buy_book_btn.setVisible(not self.db.user_owns_book(self.current_user[0], book_id))
         self.selected_book_item = item
 
         # Also show view info button
@@ -1327,6 +1915,8 @@ class LoginSignupApp(QMainWindow):
     
     def handle_buy_book(self):
         """Handle purchasing a selected book"""
+        if self.enforce_ban():
+            return
         if not hasattr(self, 'selected_book_item') or self.selected_book_item is None:
             QMessageBox.warning(self, "Error", "Please select a book first")
             return
@@ -1340,6 +1930,7 @@ class LoginSignupApp(QMainWindow):
         if success:
             QMessageBox.information(self, "Purchase Successful", message)
             self.buy_book_btn.setVisible(False)
+            self.selected_book_item.setText("[Owned] " + self.selected_book_item.text())
             self.user_books_display.clearSelection()
         else:
             QMessageBox.warning(self, "Purchase Failed", message)
@@ -1380,7 +1971,7 @@ class LoginSignupApp(QMainWindow):
 
         layout = QVBoxLayout()
 
-        header = QLabel(f"{title}\nby {author}\nCategory: {category}\nPrice: ${price:.2f}")
+        header = QLabel(f"{title}\nby {author}\nCategory: {category}\nPrice: {Money(price)}")
         header.setFont(QFont("Arial", 12, QFont.Bold))
         layout.addWidget(header)
 
@@ -1389,6 +1980,27 @@ class LoginSignupApp(QMainWindow):
             desc_label.setWordWrap(True)
             layout.addWidget(desc_label)
 
+        # Other books by the same author
+        m_success, more_books = self.db.get_more_by_author(book_id)
+        if m_success and more_books:
+            more_label = QLabel(f"More by {author}: " + ", ".join(t for _bid, t in more_books))
+            more_label.setWordWrap(True)
+            layout.addWidget(more_label)
+
+        # Books other buyers of this one also bought
+        a_success, also_bought = self.db.get_also_bought(book_id)
+        if a_success and also_bought:
+            also_label = QLabel("Readers who bought this also bought: " + ", ".join(t for _bid, t, _n in also_bought))
+            also_label.setWordWrap(True)
+            layout.addWidget(also_label)
+
+        # Books with similar text, useful before a new book has any purchases
+        s_success, similar_books = self.db.get_similar_books(book_id)
+        if s_success and similar_books:
+            similar_label = QLabel("Similar books: " + ", ".join(t for _bid, t, _score in similar_books))
+            similar_label.setWordWrap(True)
+            layout.addWidget(similar_label)
+
         # Reviews section
         reviews_label = QLabel("Reviews:")
         reviews_label.setFont(QFont("Arial", 11, QFont.Bold))
@@ -1408,7 +2020,8 @@ class LoginSignupApp(QMainWindow):
                 reviews_layout.addWidget(QLabel("No reviews yet. Be the first to review!"))
             else:
                 for rev_id, user_id, username, rating, review_text, created_at in reviews:
-                    rev_widget = QLabel(f"{username} ({created_at}):\n{review_text}")
+                    stars = f" {rating}/5" if rating else ""
+                    rev_widget = QLabel(f"{username}{stars} ({created_at}):\n{review_text}")
                     rev_widget.setWordWrap(True)
                     reviews_layout.addWidget(rev_widget)
 
@@ -1427,17 +2040,25 @@ class LoginSignupApp(QMainWindow):
             self.new_review_text.setMinimumHeight(80)
             layout.addWidget(self.new_review_text)
 
+            rating_combo = QComboBox()
+            rating_combo.addItem("No rating", None)
+            for stars in range(5, 0, -1):
+                rating_combo.addItem(f"{stars} / 5", stars)
+            layout.addWidget(rating_combo)
+
             submit_btn = QPushButton("Submit Review")
             submit_btn.setMinimumHeight(35)
 
             def submit_review():
+                if self.enforce_ban():
+                    return
                 text = self.new_review_text.toPlainText().strip()
                 if not text:
                     QMessageBox.warning(dialog, "Input Error", "Please write a review before submitting")
                     return
 
                 user_id = self.current_user[0]
-                ok, msg = self.db.add_review(user_id, book_id, text)
+                ok, msg = self.db.add_review(user_id, book_id, text, rating_combo.currentData())
                 if ok:
                     QMessageBox.information(dialog, "Success", msg)
                     # refresh dialog: close and reopen to show new review
@@ -1515,21 +2136,15 @@ class LoginSignupApp(QMainWindow):
             return
         
         for purchase in purchases:
-            purchase_id, title, author, category, orig_price, discount_amount, final_price, purchase_date = purchase
-            
-            # Get book_id for this purchase
-            cursor = self.db.db_path  # Need to get book_id, let's use a simpler approach
+            purchase_id, book_id, title, author, category, orig_price, discount_amount, final_price, purchase_date = purchase
             
-            purchase_text = f"{title}\nby {author}\nCategory: {category}\nOriginal Price: ${orig_price:.2f}\nDiscount: ${discount_amount:.2f}\nFinal Price: ${final_price:.2f}\nPurchased: {purchase_date}"
+            purchase_text = f"{title}\nby {author}\nCategory: {category}\nOriginal Price: {Money(orig_price)}\nDiscount: {Money(discount_amount)}\nFinal Price: {Money(final_price)}\nPurchased: {purchase_date}"
             
             list_item = QListWidgetItem(purchase_text)
-            list_item.setData(Qt.UserRole, purchase_id)
+            list_item.setData(Qt.UserRole, book_id)
             list_item.setFont(QFont("Arial", 10))
-            self.user_purchases_data[purchase_id] = title  # Store for reference
+            self.user_purchases_data[book_id] = title  # Store for reference
             self.user_purchases_display.addItem(list_item)
-        
-        # Connect item selection to show read button
-        self.user_purchases_display.itemClicked.connect(self.on_purchase_selected)
     
     def on_purchase_selected(self, item):
         """Handle purchase selection"""
@@ -1538,41 +2153,65 @@ class LoginSignupApp(QMainWindow):
     
     def handle_read_book(self):
         """Handle reading a purchased book"""
+        if self.enforce_ban():
+            return
         if not hasattr(self, 'selected_purchase_item') or self.selected_purchase_item is None:
             QMessageBox.warning(self, "Error", "Please select a book first")
             return
         
-        purchase_id = self.selected_purchase_item.data(Qt.UserRole)
+        book_id = self.selected_purchase_item.data(Qt.UserRole)
         
-        # Get book_id from purchase - we need to query the database
-        import sqlite3
-        conn = sqlite3.connect(self.db.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT book_id FROM purchases WHERE id = ?', (purchase_id,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result:
-            QMessageBox.critical(self, "Error", "Could not find book")
+        if book_id is None or not self.db.user_owns_book(self.current_user[0], book_id):
+            QMessageBox.critical(self, "Error", "You have not purchased this book")
             return
         
-        book_id = result[0]
-        
-        # Get book content
-        success, book_data = self.db.get_book_content(book_id)
+        # Get the title and length; the text itself is loaded a chunk at a time
+        success, book_data = self.db.get_reader_info(book_id)
         
         if not success:
             QMessageBox.critical(self, "Error", book_data)
             return
         
-        title, author, content = book_data
+        title, author, length = book_data
+        
+        success, position = self.db.get_reading_position(self.current_user[0], book_id)
+        if not success:
+            position = 0
         
         # Display book in reader
         self.reader_book_title.setText(title)
         self.reader_book_author.setText(f"by {author}")
-        self.book_content_display.setText(content if content else "No content available for this book")
-        
         self.show_page(10)  # Show book reader page
+        
+        if length:
+            self.reader_view.open(length, lambda start, count: self.read_book_text(book_id, start, count), position)
+        else:
+            placeholder = "No content available for this book"
+            self.reader_view.open(len(placeholder), lambda start, count: placeholder[start:start + count])
+        self.reader_book_id = book_id
+    
+    def read_book_text(self, book_id, start, count):
+        """Text loader for the reader view; a failed read shows as blank text"""
+        success, text = self.db.get_book_text(book_id, start, count)
+        return text if success else ""
+    
+    def handle_reader_position_changed(self, position):
+        """Track the first visible character; written later by the flush timer"""
+        if self.reader_book_id is None or not self.current_user:
+            return
+        self.db.update_reading_position(self.current_user[0], self.reader_book_id, position)
+        if not self.progress_flush_timer.isActive():
+            self.progress_flush_timer.start()
+    
+    def handle_progress_flush_timer(self):
+        """Write reading positions collected since the last flush"""
+        self.db.flush_reading_progress()
+    
+    def close_reader(self):
+        """Stop tracking the open book and write its last position"""
+        self.reader_book_id = None
+        self.progress_flush_timer.stop()
+        self.db.flush_reading_progress()
     
     def apply_stylesheet(self):
         """Apply stylesheet to the application"""
@@ -1613,6 +2252,11 @@ class LoginSignupApp(QMainWindow):
 def main():
     app = QApplication(sys.argv)
     window = LoginSignupApp()
+    app.aboutToQuit.connect(window.close_reader)
+    if window.profiler:
+        window.profiler.start()
+        app.aboutToQuit.connect(lambda: print(window.profiler.report()))
+        app.aboutToQuit.connect(window.profiler.dump)
     window.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,127 @@
+"""Scheduled database maintenance, e.g. from cron:
+
+    python maintenance.py --db users.db archive-notifications --max-age-days 90
+    python maintenance.py --db users.db maintain
+"""
+import argparse
+import sys
+
+from auth_db import AuthDatabase
+
+
+def archive_notifications(db, args):
+    success, result = db.archive_notifications(
+        max_age_days=args.max_age_days,
+        keep_per_user=args.keep_per_user,
+        batch_size=args.batch_size,
+        archive_path=args.archive,
+    )
+    if not success:
+        return result
+    print(f"Archived {result} notifications")
+    if args.reclaim:
+        success, result = db.reclaim_space()
+        if not success:
+            return result
+        print(f"Freed {result} pages")
+    return None
+
+
+def rebuild_co_purchases(db, args):
+    success, result = db.rebuild_co_purchases()
+    if not success:
+        return result
+    print(f"Rebuilt {result} co-purchase pairs")
+    return None
+
+
+def rebuild_similar_books(db, args):
+    success, result = db.rebuild_similar_books(top_k=args.top_k)
+    if not success:
+        return result
+    print(f"Indexed {result} books for similarity")
+    return None
+
+
+def format_stats(stats):
+    return (f"{stats['page_count']} pages of {stats['page_size']} bytes, "
+            f"{stats['freelist_count']} free ({stats['fragmentation']:.1%})")
+
+
+def maintain(db, args):
+    success, before = db.get_database_stats()
+    if not success:
+        return before
+    print(f"Before: {format_stats(before)}")
+
+    if not args.no_vacuum:
+        success, result = db.enable_incremental_vacuum()
+        if not success:
+            return result
+        if result:
+            print("Converted to auto_vacuum=INCREMENTAL (full VACUUM)")
+        else:
+            success, result = db.reclaim_space(max_pages=args.vacuum_pages)
+            if not success:
+                return result
+            print(f"Incremental vacuum freed {result} pages")
+
+    success, result = db.optimize_database(analyze=args.analyze)
+    if not success:
+        return result
+    print("ANALYZE complete" if args.analyze else "PRAGMA optimize complete")
+
+    if not args.no_check:
+        success, problems = db.check_integrity()
+        if not success:
+            return problems
+        if problems:
+            return "quick_check found problems:\n" + "\n".join(problems)
+        print("quick_check ok")
+
+    success, after = db.get_database_stats()
+    if not success:
+        return after
+    print(f"After: {format_stats(after)}")
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AppBook database maintenance")
+    parser.add_argument("--db", default="users.db", help="database file (default: users.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive-notifications", help="move expired notifications to the archive")
+    archive.add_argument("--max-age-days", type=int, default=90)
+    archive.add_argument("--keep-per-user", type=int, default=200,
+                         help="newest notifications kept per recipient; broadcasts count as one recipient")
+    archive.add_argument("--batch-size", type=int, default=1000)
+    archive.add_argument("--archive", help="archive database (default: <db name>_archive.db)")
+    archive.add_argument("--reclaim", action="store_true", help="run an incremental vacuum afterwards")
+    archive.set_defaults(run=archive_notifications)
+
+    routine = commands.add_parser("maintain", help="vacuum, refresh statistics and check integrity")
+    routine.add_argument("--analyze", action="store_true", help="full ANALYZE instead of PRAGMA optimize")
+    routine.add_argument("--vacuum-pages", type=int, help="free at most this many pages (default: all)")
+    routine.add_argument("--no-vacuum", action="store_true")
+    routine.add_argument("--no-check", action="store_true", help="skip PRAGMA quick_check")
+    routine.set_defaults(run=maintain)
+
+    co_purchases = commands.add_parser("rebuild-co-purchases",
+                                       help="recompute 'also bought' counts from purchases")
+    co_purchases.set_defaults(run=rebuild_co_purchases)
+
+    similar = commands.add_parser("rebuild-similar-books", help="recompute TF-IDF similar books from book text")
+    similar.add_argument("--top-k", type=int, help="similar books kept per book (default: 10)")
+    similar.set_defaults(run=rebuild_similar_books)
+
+    args = parser.parse_args(argv)
+    error = args.run(AuthDatabase(args.db), args)
+    if error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+# Discount on an integer cents expression for a percentage expression, rounded half up
+# to a whole cent. Listings (effective_prices) and purchases both price with this, so a
+# buyer is always charged the price they were shown.
+DISCOUNT_CENTS_SQL = '(({cents}) * CAST(ROUND(({percentage}) * 100) AS INTEGER) + 5000) / 10000'
+
+
+class Money:
+    """An amount of money held as integer cents"""
+
+    __slots__ = ('cents',)
+
+    def __init__(self, cents):
+        self.cents = int(cents)
+
+    @classmethod
+    def parse(cls, text):
+        """Parse user input such as '12', '12.5' or '$-2.50'; raises ValueError"""
+        try:
+            amount = Decimal(text.strip().replace('$', ''))
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {text!r}")
+        if not amount.is_finite():
+            raise ValueError(f"Invalid amount: {text!r}")
+        return cls(amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+    def __add__(self, other):
+        return Money(self.cents + other.cents)
+
+    def __sub__(self, other):
+        return Money(self.cents - other.cents)
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and self.cents == other.cents
+
+    def __lt__(self, other):
+        return self.cents < other.cents
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __str__(self):
+        sign = '-' if self.cents < 0 else ''
+        return f"{sign}${abs(self.cents) // 100}.{abs(self.cents) % 100:02d}"
+
+    def __repr__(self):
+        return f"Money({self.cents})"
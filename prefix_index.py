@@ -0,0 +1,84 @@
+import bisect
+import threading
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over book titles and authors.
+
+    Every word start of a title or author name is a key, so "pot" finds
+    "Harry Potter" as well as "Pottery Basics".
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        # Sorted "key\0book_id" strings; plain strings sort far faster than tuples
+        self._entries = []
+        self._books = {}      # book_id -> (title, author, entries)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows, version=None):
+        """Build an index from (book_id, title, author) rows"""
+        index = cls(version)
+        author_keys = {}  # authors usually have several books
+        for book_id, title, author in rows:
+            if author not in author_keys:
+                author_keys[author] = cls._word_keys(author)
+            entries = cls._entries_for(book_id, cls._word_keys(title) | author_keys[author])
+            index._books[book_id] = (title, author, entries)
+            index._entries.extend(entries)
+        index._entries.sort()
+        return index
+
+    @staticmethod
+    def _word_keys(text):
+        words = text.lower().split()
+        return {" ".join(words[start:]) for start in range(len(words))}
+
+    @staticmethod
+    def _entries_for(book_id, keys):
+        suffix = f"\0{book_id}"
+        return [key + suffix for key in keys]
+
+    def add(self, book_id, title, author):
+        """Index a new book"""
+        entries = self._entries_for(book_id, self._word_keys(title) | self._word_keys(author))
+        with self._lock:
+            self._books[book_id] = (title, author, entries)
+            for entry in entries:
+                bisect.insort(self._entries, entry)
+
+    def remove(self, book_id):
+        """Drop a book from the index"""
+        with self._lock:
+            entry = self._books.pop(book_id, None)
+            if entry is None:
+                return
+            for indexed in entry[2]:
+                position = bisect.bisect_left(self._entries, indexed)
+                if position < len(self._entries) and self._entries[position] == indexed:
+                    del self._entries[position]
+
+    def suggest(self, prefix, limit=10):
+        """Return up to limit (book_id, title, author) whose title or author has a word starting with prefix"""
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return []
+        suggestions = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._entries, prefix)
+            while position < len(self._entries) and len(suggestions) < limit:
+                entry = self._entries[position]
+                if not entry.startswith(prefix):
+                    break
+                book_id = int(entry.rpartition("\0")[2])
+                if book_id not in seen:
+                    seen.add(book_id)
+                    title, author, _entries = self._books[book_id]
+                    suggestions.append((book_id, title, author))
+                position += 1
+        return suggestions
+
+    def __len__(self):
+        return len(self._books)
@@ -0,0 +1,40 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets with an LRU bound on the number of tracked keys"""
+
+    def __init__(self, capacity, refill_per_second, max_keys=10000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last_refill]
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Take one token for key; return False if its bucket is empty"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.capacity), now]
+                if len(self._buckets) > self.max_keys:
+                    # Forget the least recently seen key; it restarts with a full bucket
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                elapsed = now - bucket[1]
+                bucket[0] = min(self.capacity, bucket[0] + elapsed * self.refill_per_second)
+                bucket[1] = now
+
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
+
+    def reset(self, key):
+        """Give key a full bucket again"""
+        with self._lock:
+            self._buckets.pop(key, None)
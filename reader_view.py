@@ -0,0 +1,199 @@
+from PySide6.QtCore import Signal
+from PySide6.QtGui import QFont, QTextCursor
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QPushButton, QLabel, QSpinBox, QAbstractSlider
+)
+
+
+def qt_length(text):
+    """Length of text in Qt's UTF-16 units"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def qt_to_index(text, offset):
+    """Convert a UTF-16 offset into text to a Python string index"""
+    if qt_length(text) == len(text):
+        return offset
+    units = 0
+    for index, char in enumerate(text):
+        if units >= offset:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(text)
+
+
+class ReaderView(QWidget):
+    """Plain-text book reader that only holds a few chunks of the book at a time.
+
+    Text is requested through loader(start, count) as the user scrolls, so layout time
+    and memory stay the same however large the book is. Positions are character
+    offsets into the whole book.
+    """
+
+    positionChanged = Signal(int)
+
+    def __init__(self, chunk_chars=32768, max_chunks=3, parent=None):
+        super().__init__(parent)
+        self.chunk_chars = chunk_chars
+        self.max_chunks = max_chunks
+        self._length = 0
+        self._loader = None
+        self._chunks = []        # consecutive (start, text) pieces currently in the editor
+        self._adjusting = False  # set while the window is being moved
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.editor = QPlainTextEdit()
+        self.editor.setReadOnly(True)
+        self.editor.setFont(QFont("Arial", 11))
+        self.editor.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        layout.addWidget(self.editor)
+
+        navigation = QHBoxLayout()
+        previous_btn = QPushButton("Previous Page")
+        previous_btn.clicked.connect(self.page_up)
+        navigation.addWidget(previous_btn)
+
+        next_btn = QPushButton("Next Page")
+        next_btn.clicked.connect(self.page_down)
+        navigation.addWidget(next_btn)
+
+        navigation.addStretch()
+
+        navigation.addWidget(QLabel("Go to:"))
+        self.percent_input = QSpinBox()
+        self.percent_input.setRange(0, 100)
+        self.percent_input.setSuffix("%")
+        self.percent_input.editingFinished.connect(self._on_percent_entered)
+        navigation.addWidget(self.percent_input)
+
+        self.progress_label = QLabel()
+        navigation.addWidget(self.progress_label)
+        layout.addLayout(navigation)
+
+        self.setLayout(layout)
+
+    def open(self, length, loader, position=0):
+        """Show a book of length characters, starting at position"""
+        self._length = length
+        self._loader = loader
+        self.set_position(position)
+
+    def position(self):
+        """Character offset of the first visible character"""
+        if not self._chunks:
+            return 0
+        offset = self.editor.cursorForPosition(self.editor.viewport().rect().topLeft()).position()
+        for start, text in self._chunks:
+            size = qt_length(text)
+            if offset < size:
+                return start + qt_to_index(text, offset)
+            offset -= size
+        start, text = self._chunks[-1]
+        return start + len(text)
+
+    def percent(self):
+        return 100 * self.position() // self._length if self._length else 0
+
+    def set_position(self, position):
+        """Load the chunks around position and scroll it to the top"""
+        position = max(0, min(position, self._length))
+        first = max(0, position // self.chunk_chars - (self.max_chunks - 1) // 2)
+        self._adjusting = True
+        self._chunks = []
+        for index in range(first, first + self.max_chunks):
+            start = index * self.chunk_chars
+            if start >= self._length and self._chunks:
+                break
+            self._chunks.append((start, self._load(start)))
+        self.editor.setPlainText("".join(text for _start, text in self._chunks))
+        self._scroll_to(self._local_offset(position))
+        self._adjusting = False
+        self._on_scrolled()
+
+    def page_down(self):
+        self.editor.verticalScrollBar().triggerAction(QAbstractSlider.SliderPageStepAdd)
+
+    def page_up(self):
+        self.editor.verticalScrollBar().triggerAction(QAbstractSlider.SliderPageStepSub)
+
+    def _load(self, start):
+        # Carriage returns become spaces so Qt offsets stay in step with the book's
+        text = self._loader(start, self.chunk_chars) if self._loader else ""
+        return text.replace("\r", " ")
+
+    def _local_offset(self, position):
+        """Editor offset of a book position inside the loaded chunks"""
+        offset = 0
+        for start, text in self._chunks:
+            if position < start + len(text):
+                return offset + qt_length(text[:position - start])
+            offset += qt_length(text)
+        return offset
+
+    def _scroll_to(self, offset):
+        # Scrolling down to the cursor leaves it on the top line
+        scroll_bar = self.editor.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
+        cursor = self.editor.textCursor()
+        cursor.setPosition(min(offset, self.editor.document().characterCount() - 1))
+        self.editor.setTextCursor(cursor)
+        self.editor.ensureCursorVisible()
+
+    def _on_scrolled(self, _value=None):
+        if self._adjusting or not self._chunks:
+            return
+        scroll_bar = self.editor.verticalScrollBar()
+        if scroll_bar.value() >= scroll_bar.maximum() - scroll_bar.pageStep():
+            self._extend_forward()
+        elif scroll_bar.value() <= scroll_bar.pageStep():
+            self._extend_backward()
+
+        position = self.position()
+        self.progress_label.setText(f"{self.percent()}% of {self._length:,} characters")
+        self.positionChanged.emit(position)
+
+    def _extend_forward(self):
+        """Append the next chunk, dropping the first one if the window is full"""
+        start, text = self._chunks[-1]
+        next_start = start + len(text)
+        if next_start >= self._length:
+            return
+        self._adjusting = True
+        position = self.position()
+        cursor = QTextCursor(self.editor.document())
+        cursor.movePosition(QTextCursor.End)
+        chunk = self._load(next_start)
+        cursor.insertText(chunk)
+        self._chunks.append((next_start, chunk))
+        if len(self._chunks) > self.max_chunks:
+            _start, dropped = self._chunks.pop(0)
+            cursor.setPosition(0)
+            cursor.setPosition(qt_length(dropped), QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+            self._scroll_to(self._local_offset(position))
+        self._adjusting = False
+
+    def _extend_backward(self):
+        """Prepend the previous chunk, dropping the last one if the window is full"""
+        start = self._chunks[0][0]
+        if start == 0:
+            return
+        self._adjusting = True
+        position = self.position()
+        previous_start = max(0, start - self.chunk_chars)
+        chunk = self._load(previous_start)[:start - previous_start]
+        cursor = QTextCursor(self.editor.document())
+        cursor.insertText(chunk)
+        self._chunks.insert(0, (previous_start, chunk))
+        if len(self._chunks) > self.max_chunks:
+            _start, dropped = self._chunks.pop()
+            cursor.movePosition(QTextCursor.End)
+            cursor.setPosition(cursor.position() - qt_length(dropped), QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+        self._scroll_to(self._local_offset(position))
+        self._adjusting = False
+
+    def _on_percent_entered(self):
+        self.set_position(self._length * self.percent_input.value() // 100)
@@ -0,0 +1,153 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback below
+    np = None
+
+
+WORD_RE = re.compile(r"[a-z]{3,}")
+
+STOP_WORDS = frozenset("""
+    about above after again against all also and any are because been before being below between
+    both but can could did does doing down during each few for from further had has have having her
+    here hers herself him himself his how into its itself just more most not now off once only other
+    our ours out over own said same she should some such than that the their theirs them themselves
+    then there these they this those through too under until very was were what when where which
+    while who whom why will with would you your yours yourself
+""".split())
+
+
+def term_counts(chunks, max_terms=64):
+    """Count the words of an iterable of text chunks; return the max_terms most frequent.
+
+    Chunks may split a word; the partial word is carried over to the next chunk.
+    """
+    counts = Counter()
+    carry = ""
+    for chunk in chunks:
+        text = carry + chunk.lower()
+        cut = len(text)
+        while cut and text[cut - 1].isalpha():
+            cut -= 1
+        carry = text[cut:]
+        counts.update(word for word in WORD_RE.findall(text, 0, cut) if word not in STOP_WORDS)
+    counts.update(word for word in WORD_RE.findall(carry) if word not in STOP_WORDS)
+    return dict(counts.most_common(max_terms))
+
+
+def idf(doc_count, total_docs):
+    """Smoothed inverse document frequency"""
+    return math.log((1 + total_docs) / (1 + doc_count)) + 1
+
+
+def too_common(doc_count, total_docs, max_df):
+    """Words in more than max_df of a large collection say little and cost the most to score"""
+    return total_docs >= 100 and doc_count > max_df * total_docs
+
+
+def vectorize(counts, doc_freq, total_docs, max_df=0.5):
+    """Unit-length TF-IDF vector {term: weight} of one document's term counts"""
+    vector = {}
+    for term, count in counts.items():
+        doc_count = doc_freq.get(term, 0)
+        if not too_common(doc_count, total_docs, max_df):
+            vector[term] = (1 + math.log(count)) * idf(doc_count, total_docs)
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+def build_similarities(documents, top_k=10, max_df=0.5):
+    """TF-IDF vectors and the top_k most similar documents of each document.
+
+    documents maps a document id to its term counts. Returns ({id: {term: weight}},
+    {id: [(other_id, cosine), ...]}), best first. Uses NumPy when it is installed.
+    """
+    doc_freq = Counter()
+    for counts in documents.values():
+        doc_freq.update(counts.keys())
+    if np is not None:
+        return _build_similarities_numpy(documents, doc_freq, top_k, max_df)
+
+    vectors = {doc_id: vectorize(counts, doc_freq, len(documents), max_df)
+               for doc_id, counts in documents.items()}
+    postings = {}
+    for doc_id, vector in vectors.items():
+        for term, weight in vector.items():
+            postings.setdefault(term, []).append((doc_id, weight))
+
+    similar = {}
+    for doc_id, vector in vectors.items():
+        scores = Counter()
+        for term, weight in vector.items():
+            for other_id, other_weight in postings[term]:
+                scores[other_id] += weight * other_weight
+        scores.pop(doc_id, None)
+        similar[doc_id] = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+    return vectors, similar
+
+
+def _build_similarities_numpy(documents, doc_freq, top_k, max_df):
+    ids = list(documents)
+    id_array = np.array(ids)
+    total_docs = len(ids)
+    terms = [term for term, doc_count in doc_freq.items() if not too_common(doc_count, total_docs, max_df)]
+    term_index = {term: position for position, term in enumerate(terms)}
+
+    # One entry per (document, term), grouped by document
+    doc_rows, term_rows, counts = [], [], []
+    for position, doc_id in enumerate(ids):
+        for term, count in documents[doc_id].items():
+            index = term_index.get(term)
+            if index is not None:
+                doc_rows.append(position)
+                term_rows.append(index)
+                counts.append(count)
+    doc_rows = np.array(doc_rows, dtype=np.int64)
+    term_rows = np.array(term_rows, dtype=np.int64)
+
+    idfs = np.log((1 + total_docs) / (1 + np.array([doc_freq[term] for term in terms], dtype=np.float64))) + 1
+    weights = (1 + np.log(np.array(counts, dtype=np.float64))) * idfs[term_rows]
+    norms = np.sqrt(np.bincount(doc_rows, weights=weights * weights, minlength=total_docs))
+    weights /= norms[doc_rows]
+
+    # Postings: the same entries grouped by term
+    by_term = np.argsort(term_rows, kind='stable')
+    posting_docs = doc_rows[by_term]
+    posting_weights = weights[by_term]
+    posting_starts = np.concatenate(([0], np.cumsum(np.bincount(term_rows, minlength=len(terms)))))
+    doc_starts = np.concatenate(([0], np.cumsum(np.bincount(doc_rows, minlength=total_docs))))
+
+    vectors, similar = {}, {}
+    for position, doc_id in enumerate(ids):
+        start, end = doc_starts[position], doc_starts[position + 1]
+        vectors[doc_id] = {terms[t]: float(w) for t, w in zip(term_rows[start:end], weights[start:end])}
+        if start == end:
+            similar[doc_id] = []
+            continue
+
+        # Sparse dot product with every document sharing a term
+        slices = [slice(posting_starts[t], posting_starts[t + 1]) for t in term_rows[start:end]]
+        candidates = np.concatenate([posting_docs[s] for s in slices])
+        products = np.concatenate([posting_weights[s] * w for s, w in zip(slices, weights[start:end])])
+        if len(candidates) * 8 > total_docs:
+            # Dense accumulation beats sorting once most documents are candidates
+            others = np.arange(total_docs)
+            scores = np.bincount(candidates, weights=products, minlength=total_docs)
+        else:
+            others, inverse = np.unique(candidates, return_inverse=True)
+            scores = np.bincount(inverse, weights=products)
+        scores[others == position] = -1.0
+
+        # Best score first, ties by lowest document id, as in the pure-Python path.
+        # Everything tied with the k-th best score competes for the last places.
+        if len(scores) > top_k:
+            best = np.flatnonzero(scores >= np.partition(scores, len(scores) - top_k)[len(scores) - top_k])
+        else:
+            best = np.arange(len(scores))
+        best = best[np.lexsort((id_array[others[best]], -scores[best]))][:top_k]
+        similar[doc_id] = [(ids[others[i]], float(scores[i])) for i in best if scores[i] > 0]
+    return vectors, similar
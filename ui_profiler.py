@@ -0,0 +1,149 @@
+import cProfile
+import functools
+import heapq
+import inspect
+import itertools
+import os
+import time
+from PySide6.QtCore import QTimer
+from db_instrumentation import LatencyHistogram
+
+
+class InteractionProfiler:
+    """Opt-in profiler measuring how long UI slots block the event loop"""
+
+    SLOT_PREFIXES = ('handle_', 'refresh_', 'on_', 'show_', 'clear_')
+
+    def __init__(self, stall_ms=100.0, profile_dir=None, keep_slowest=5, heartbeat_ms=20):
+        self.stall_ms = stall_ms
+        self.profile_dir = profile_dir
+        self.keep_slowest = keep_slowest
+        self.heartbeat_ms = heartbeat_ms
+        self.slot_latency = {}
+        self.stalls = []
+        self.last_handler = None
+        self._stack = []
+        self._slowest = []  # min-heap of (elapsed_ms, seq, name, profile)
+        self._seq = itertools.count()
+        self._heartbeat = None
+        self._last_tick = None
+
+    @classmethod
+    def from_env(cls):
+        """Create a profiler when APPBOOK_PROFILE is set, otherwise return None"""
+        if not os.environ.get("APPBOOK_PROFILE"):
+            return None
+        return cls(
+            stall_ms=float(os.environ.get("APPBOOK_STALL_MS", "100")),
+            profile_dir=os.environ.get("APPBOOK_PROFILE_DIR") or None,
+        )
+
+    def instrument(self, window):
+        """Wrap every slot-like method of window so connections pick up the timed version"""
+        for name in dir(type(window)):
+            if name.startswith(self.SLOT_PREFIXES) and callable(getattr(window, name)):
+                setattr(window, name, self.wrap(name, getattr(window, name)))
+
+    def wrap(self, name, func):
+        """Return func timed as the slot called name"""
+        # Signals may pass more arguments (e.g. clicked's checked flag) than the slot takes
+        params = inspect.signature(func).parameters.values()
+        if any(p.kind == p.VAR_POSITIONAL for p in params):
+            max_args = None
+        else:
+            max_args = sum(1 for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+
+        @functools.wraps(func)
+        def timed_slot(*args, **kwargs):
+            return self._run(name, func, args[:max_args], kwargs)
+        return timed_slot
+
+    def start(self):
+        """Start the heartbeat used to detect stalls outside timed slots"""
+        self._last_tick = time.perf_counter()
+        self._heartbeat = QTimer()
+        self._heartbeat.timeout.connect(self._tick)
+        self._heartbeat.start(self.heartbeat_ms)
+
+    def _run(self, name, func, args, kwargs):
+        frame = {'name': name, 'start': time.perf_counter(), 'modal_ms': 0.0}
+        profile = None
+        if self.profile_dir and not self._stack:
+            profile = cProfile.Profile()
+        self._stack.append(frame)
+        try:
+            if profile is None:
+                return func(*args, **kwargs)
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self._stack.pop()
+            if not self._stack and self._last_tick is not None:
+                # The slot's own blocking time is reported below, not by the next heartbeat
+                self._last_tick = time.perf_counter()
+            # Time spent inside nested event loops (dialogs, message boxes) is not blocking
+            elapsed_ms = (time.perf_counter() - frame['start']) * 1000 - frame['modal_ms']
+            self._record(name, max(0.0, elapsed_ms), profile)
+
+    def _record(self, name, elapsed_ms, profile):
+        histogram = self.slot_latency.get(name)
+        if histogram is None:
+            histogram = self.slot_latency[name] = LatencyHistogram()
+        histogram.record(elapsed_ms)
+        self.last_handler = name
+
+        if elapsed_ms >= self.stall_ms:
+            self.stalls.append((time.time(), name, elapsed_ms))
+
+        if profile is not None:
+            entry = (elapsed_ms, next(self._seq), name, profile)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, entry)
+            elif elapsed_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def _tick(self):
+        now = time.perf_counter()
+        gap_ms = (now - self._last_tick) * 1000
+        self._last_tick = now
+
+        # A tick while a slot is running means a nested event loop is serving events
+        for frame in self._stack:
+            since_start_ms = (now - frame['start']) * 1000
+            frame['modal_ms'] += min(gap_ms, self.heartbeat_ms, since_start_ms)
+
+        lateness_ms = gap_ms - self.heartbeat_ms
+        if lateness_ms >= self.stall_ms and not self._stack:
+            # Blocked outside a timed slot, e.g. painting what the last handler populated
+            self.stalls.append((time.time(), f"after {self.last_handler}", lateness_ms))
+
+    def report(self):
+        """Return a plain-text summary of slot latency and stalls"""
+        lines = ["Slot latency (ms):"]
+        ordered = sorted(self.slot_latency.items(), key=lambda item: -item[1].summary()['p95_ms'])
+        for name, histogram in ordered:
+            s = histogram.summary()
+            lines.append(f"  {name}: n={s['count']} mean={s['mean_ms']:.1f} "
+                         f"p95={s['p95_ms']:.1f} max={s['max_ms']:.1f}")
+        lines.append(f"Stalls >= {self.stall_ms:.0f} ms:")
+        for timestamp, name, elapsed_ms in self.stalls:
+            when = time.strftime('%H:%M:%S', time.localtime(timestamp))
+            lines.append(f"  {when} {name}: {elapsed_ms:.1f}")
+        return "\n".join(lines)
+
+    def dump(self):
+        """Write the report and the cProfile data of the slowest interactions to profile_dir"""
+        if not self.profile_dir:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        written = []
+        report_path = os.path.join(self.profile_dir, "interactions.txt")
+        with open(report_path, "w") as report_file:
+            report_file.write(self.report() + "\n")
+        written.append(report_path)
+
+        ranked = sorted(self._slowest, reverse=True)
+        for rank, (elapsed_ms, _seq, name, profile) in enumerate(ranked, start=1):
+            path = os.path.join(self.profile_dir, f"{rank:02d}_{name}_{elapsed_ms:.0f}ms.prof")
+            profile.dump_stats(path)
+            written.append(path)
+        return written
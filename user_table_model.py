@@ -0,0 +1,77 @@
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class UserTableModel(QAbstractTableModel):
+    """Users from AuthDatabase.search_users, fetched a page at a time as the view scrolls"""
+
+    HEADERS = ("Username", "Email", "Status", "Created (UTC)")
+
+    def __init__(self, db, page_size=200, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.page_size = page_size
+        self.filters = {}
+        self.error = None
+        self._rows = []       # (id, username, email, is_banned, created_at)
+        self._after = None    # keyset cursor of the last loaded page
+        self._exhausted = True
+
+    def set_filters(self, **filters):
+        """Restart from the first page with new search_users filters; return False on error"""
+        self.beginResetModel()
+        self.filters = filters
+        self.error = None
+        self._rows = []
+        self._after = None
+        self._exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+        return self.error is None
+
+    def user(self, row):
+        """Return the (id, username, email, is_banned, created_at) row"""
+        return self._rows[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        user_id, username, email, is_banned, created_at = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            return (username, email, "BANNED" if is_banned else "Active", created_at)[index.column()]
+        if role == Qt.ForegroundRole:
+            # Color code banned users
+            return Qt.red if is_banned else Qt.darkGreen
+        if role == Qt.UserRole:
+            return user_id
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        success, result = self.db.search_users(after=self._after, limit=self.page_size, **self.filters)
+        if not success:
+            self.error = result
+            self._exhausted = True
+            return
+
+        rows, self._after = result
+        self._exhausted = self._after is None
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()